@@ -0,0 +1,211 @@
+# Decides when a download may start, so a run can't fill the disk
+# or take over the office's internet connection.
+#
+# Before each download we set aside room for it on the disk, using the
+# size of the course's last export, or the size the server tells us once
+# the download starts. That room shrinks as the file grows, since what's
+# already written comes out of the disk's free space, so each byte is
+# only counted once. A download waits while that would leave less
+# than the reserve free, and while too many others are going.
+# All downloads together share one bandwidth limit (a token bucket).
+
+import os
+import time
+import shutil
+import threading
+
+# Works whether this is run as a script or from the installed package.
+try:
+    from edx_backup_script import downloads
+except ImportError:
+    import downloads
+
+# Free space to always leave alone.
+default_reserve = 1024 * 1024 * 1024  # bytes
+# How often a waiting download looks at the disk again,
+# in case something else freed up space.
+recheck_interval = 5  # seconds
+
+
+class AdmissionError(Exception):
+    pass
+
+
+def newController(folder, reserve=default_reserve, max_downloads=None, max_rate=None):
+    """
+    Parameters:
+    folder (str): Where the downloads go. Its disk is the one we watch.
+    reserve (int): Bytes of free space to keep.
+    max_downloads (int): How many downloads at once. None for no limit.
+    max_rate (float): Bytes per second for all downloads together.
+                      None for no limit.
+
+    Returns:
+    dict: The controller, for admit() and release().
+
+    """
+    return {
+        "folder": folder,
+        "reserve": reserve,
+        "max_downloads": max_downloads,
+        "active": 0,
+        # Tickets for downloads that are still going.
+        "tickets": [],
+        "condition": threading.Condition(),
+        "bucket": newBucket(max_rate) if max_rate else None,
+    }
+
+
+def freeSpace(folder):
+    """Free bytes on the disk that holds folder, even if it doesn't exist yet."""
+    while not os.path.exists(folder):
+        parent = os.path.dirname(folder)
+        if parent == folder:
+            break
+        folder = parent
+    return shutil.disk_usage(folder).free
+
+
+def written(path):
+    """How much of a download is on the disk so far, partial file included."""
+    if path is None:
+        return 0
+    size = 0
+    for candidate in [path] + [path + suffix for suffix in downloads.partial_suffixes]:
+        try:
+            size = max(size, os.path.getsize(candidate))
+        except OSError:
+            pass
+    return size
+
+
+def outstanding(controller, leave_out=None):
+    """
+    Bytes promised to downloads that are still going,
+    less what they've already written.
+    """
+    return sum(
+        max(ticket["size"] - written(ticket["path"]), 0)
+        for ticket in controller["tickets"]
+        if ticket is not leave_out
+    )
+
+
+def admit(controller, size, name="download", on_wait=None, path=None):
+    """
+    Waits until a download fits on the disk and there's a free slot,
+    then sets aside room for it.
+
+    Parameters:
+    controller (dict): From newController().
+    size (int): Estimated bytes.
+    name (str): What's being downloaded, for error messages.
+    on_wait (function): Called once with the reason, if we have to wait.
+    path (str): Where the finished file will be, so we can see how much
+                of it has been written. None to count none of it.
+
+    Returns:
+    dict: A ticket, for adjust() and release().
+
+    """
+    condition = controller["condition"]
+    waited = False
+    with condition:
+        while True:
+            free = freeSpace(controller["folder"]) - outstanding(controller)
+            busy = (
+                controller["max_downloads"] is not None
+                and controller["active"] >= controller["max_downloads"]
+            )
+            if not busy and free - size >= controller["reserve"]:
+                break
+            if not busy and controller["active"] == 0:
+                # Nothing else is downloading, so waiting won't free anything.
+                raise AdmissionError(
+                    "Not enough disk space for "
+                    + name
+                    + ": "
+                    + str(free // 2**20)
+                    + " MB free, need "
+                    + str((size + controller["reserve"]) // 2**20)
+                    + " MB"
+                )
+            if not waited and on_wait is not None:
+                on_wait("download slots full" if busy else "low disk space")
+            waited = True
+            condition.wait(recheck_interval)
+        controller["active"] += 1
+        ticket = {"size": size, "name": name, "path": path}
+        controller["tickets"].append(ticket)
+    return ticket
+
+
+def adjust(controller, ticket, size):
+    """
+    Swaps a download's estimate for its real size, once the server says.
+
+    Raises:
+    AdmissionError: If the real size won't fit, even using the reserve.
+
+    """
+    with controller["condition"]:
+        others = outstanding(controller, leave_out=ticket)
+        needed = size - written(ticket["path"])
+        if size > ticket["size"] and freeSpace(controller["folder"]) - others < needed:
+            raise AdmissionError(
+                ticket["name"] + " is " + str(size // 2**20) + " MB and won't fit"
+            )
+        ticket["size"] = size
+        controller["condition"].notify_all()
+
+
+def release(controller, ticket):
+    """Frees a finished (or failed) download's slot and set-aside space."""
+    if ticket is None:
+        return
+    with controller["condition"]:
+        controller["active"] -= 1
+        controller["tickets"].remove(ticket)
+        controller["condition"].notify_all()
+
+
+def newBucket(rate):
+    """A token bucket that refills at rate bytes a second, up to one second's worth."""
+    return {
+        "rate": float(rate),
+        "capacity": float(rate),
+        "tokens": float(rate),
+        "updated": time.monotonic(),
+        "lock": threading.Lock(),
+    }
+
+
+def take(bucket, amount):
+    """
+    Spends amount bytes from the bucket, sleeping until they've been earned.
+    Callers that go into debt make the next ones wait longer, so all
+    downloads together stay at the rate.
+    """
+    with bucket["lock"]:
+        now = time.monotonic()
+        bucket["tokens"] = min(
+            bucket["capacity"],
+            bucket["tokens"] + (now - bucket["updated"]) * bucket["rate"],
+        )
+        bucket["updated"] = now
+        bucket["tokens"] -= amount
+        debt = -bucket["tokens"]
+    if debt > 0:
+        time.sleep(debt / bucket["rate"])
+
+
+def throttle(controller):
+    """
+    Returns:
+    function: Call it with each chunk's length to stay under the rate,
+              or None if there's no limit.
+
+    """
+    if controller is None or controller["bucket"] is None:
+        return None
+    return lambda amount: take(controller["bucket"], amount)
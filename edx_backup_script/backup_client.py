@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# Sends courses to a running backup daemon (backup_daemon.py) and
+# reports how they went. The daemon already has signed-in browsers
+# waiting, so a course takes about as long as edX takes to export it.
+#
+# This only imports the standard library, so it starts right away.
+#
+# The daemon and client talk over a Unix socket, one JSON object per line.
+# The client sends one request:
+# {"command": "backup", "urls": [...], "wait": true}
+# {"command": "status"}
+# {"command": "stop"}
+# and the daemon answers with one or more messages, ending with
+# {"event": "finished", ...}
+
+import os
+import sys
+import csv
+import json
+import socket
+import argparse
+
+default_socket = os.path.join(os.path.expanduser("~"), ".edx_backup", "daemon.sock")
+
+instructions = """
+to run:
+edx_backup_client https://course-authoring.edx.org/course/course-v1:HarvardX+CS109xa+3T2023
+edx_backup_client --csv courses.csv
+edx_backup_client --status
+edx_backup_client --stop
+
+Start the daemon first with edx_backup_daemon.
+"""
+
+
+class ClientError(Exception):
+    pass
+
+
+def sendMessage(connection, message):
+    connection.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+
+def readMessages(connection):
+    """
+    Yields:
+    dict: Each JSON message that arrives, until the other end hangs up.
+
+    """
+    with connection.makefile("rb") as stream:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def request(message, socket_path=default_socket):
+    """
+    Sends one request to the daemon.
+
+    Yields:
+    dict: The daemon's answers, as they come in.
+
+    """
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        connection.close()
+        raise ClientError("No backup daemon at " + socket_path + ". Is it running?")
+    try:
+        sendMessage(connection, message)
+        yield from readMessages(connection)
+    finally:
+        connection.close()
+
+
+def readURLs(csv_path):
+    """The URL column of a course list, like the main script reads."""
+    with open(csv_path, "r") as f:
+        return [
+            row["URL"].strip().rstrip("/")
+            for row in csv.DictReader(f)
+            if row["URL"].strip()
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(usage=instructions)
+    parser.add_argument("urls", nargs="*")
+    parser.add_argument("--csv", default=None, help="Back up every course in a CSV")
+    parser.add_argument("--socket", default=default_socket)
+    parser.add_argument("--status", action="store_true")
+    parser.add_argument("--stop", action="store_true")
+    parser.add_argument(
+        "--no-wait",
+        action="store_true",
+        help="Hand the courses over and return without waiting",
+    )
+    args = parser.parse_args()
+
+    if args.status:
+        message = {"command": "status"}
+    elif args.stop:
+        message = {"command": "stop"}
+    else:
+        urls = [u.strip().rstrip("/") for u in args.urls]
+        if args.csv is not None:
+            urls += readURLs(args.csv)
+        if not urls:
+            sys.exit(instructions)
+        message = {"command": "backup", "urls": urls, "wait": not args.no_wait}
+
+    failed = 0
+    try:
+        for answer in request(message, args.socket):
+            event = answer.get("event")
+            if event == "queued":
+                print("Queued " + str(len(answer["urls"])) + " courses.")
+            elif event == "done":
+                print("Done: " + answer["url"] + " -> " + answer.get("archive", ""))
+            elif event == "failed":
+                failed += 1
+                print("Failed: " + answer["url"] + " (" + answer["reason"] + ")")
+            elif event == "error":
+                sys.exit(answer["reason"])
+            elif event == "finished":
+                print(answer.get("summary", "Finished."))
+            else:
+                print(json.dumps(answer, indent=2))
+    except ClientError as e:
+        sys.exit(str(e))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+# Keeps signed-in browsers running in the background and backs up
+# whatever courses backup_client.py sends it, so a one-off backup
+# doesn't have to start a browser and log in every time.
+#
+# The sessions are refreshed every so often by reloading Studio home,
+# which keeps edX's cookies fresh. If that shows we've been logged out,
+# the session gets a new browser and signs in again.
+#
+# to run:
+# edx_backup_daemon -n 2
+# then, from anywhere:
+# edx_backup_client https://course-authoring.edx.org/course/course-v1:HarvardX+CS109xa+3T2023
+
+import os
+import sys
+import time
+import json
+import queue
+import signal
+import argparse
+import threading
+import socketserver
+from getpass import getpass
+
+# Works whether this is run as a script or from the installed package.
+try:
+    from edx_backup_script import PullEdXBackups as backups
+    from edx_backup_script import backup_client
+    from edx_backup_script import journal
+    from edx_backup_script import metrics
+    from edx_backup_script import fake_webdriver
+    from edx_backup_script import browser_profile
+    from edx_backup_script import scheduler
+    from edx_backup_script import lean_browser
+except ImportError:
+    import PullEdXBackups as backups
+    import backup_client
+    import journal
+    import metrics
+    import fake_webdriver
+    import browser_profile
+    import scheduler
+    import lean_browser
+
+log = backups.log
+
+instructions = """
+to run:
+edx_backup_daemon (options)
+
+Options:
+  -n or --sessions: Number of signed-in browsers to keep. Default 2.
+  -d or --download: Subfolder of ~/Downloads for the exports.
+  -c or --chrome:   Use Chrome instead of default Firefox.
+  -v or --visible:  Run the browsers in normal mode instead of headless.
+  --socket:         Where to listen. Default ~/.edx_backup/daemon.sock
+  --refresh:        Minutes between session refreshes. Default 15.
+  --studio-url, --journal, --metrics, --profile-template, --fake-browser,
+  --max-downloads, --disk-reserve, --max-rate, --lean, --weigh-pages:
+                    The same as for edx_backup_script.
+
+Send it courses with edx_backup_client.
+"""
+
+# How often an idle session reloads Studio home to stay signed in.
+refresh_interval = 15 * 60  # seconds
+# How long a worker waits for a course before checking on its session.
+idle_check = 5  # seconds
+
+
+def newDaemon(args, driver_choice, username, password):
+    """
+    Returns:
+    dict: Everything the sessions and the socket server share.
+
+    """
+    return {
+        "queue": queue.Queue(),
+        "sessions": [],
+        "started": time.time(),
+        "done": 0,
+        "failed": 0,
+        "lock": threading.Lock(),
+        "stopping": threading.Event(),
+        "credentials": (username, password),
+        "driver_choice": driver_choice,
+        "run_headless": not args.visible,
+        "download_directory": args.download,
+    }
+
+
+def openSession(daemon, session, cookies=None):
+    """
+    Starts a new browser for a session and signs it in,
+    with another session's cookies if there are any.
+
+    Returns:
+    bool: True if Studio home loaded.
+
+    """
+    if session["driver"] is not None:
+        try:
+            session["driver"].quit()
+        except Exception as e:
+            log(repr(e), "DEBUG")
+    session["driver"] = None
+
+    try:
+        driver = backups.setUpWebdriver(
+            daemon["run_headless"], daemon["driver_choice"], session["directory"]
+        )
+    except Exception as e:
+        log(repr(e), "DEBUG")
+        log("Couldn't start a browser for " + session["name"] + ".", "WARNING")
+        return False
+    session["driver"] = driver
+
+    if cookies is not None and backups.transplantSession(driver, cookies):
+        session["refreshed"] = time.time()
+        return True
+    try:
+        # signIn() exits the script when it gives up. Here that just means no.
+        backups.signIn(driver, *daemon["credentials"])
+    except SystemExit:
+        log("Couldn't sign in " + session["name"] + ".", "WARNING")
+        return False
+    if not backups.openStudioHome(driver):
+        return False
+    session["refreshed"] = time.time()
+    return True
+
+
+def refreshSession(daemon, session):
+    """
+    Reloads Studio home so edX keeps the session alive.
+    If that fails, starts over with a new browser.
+
+    Returns:
+    bool: True if the session is usable.
+
+    """
+    try:
+        if backups.openStudioHome(session["driver"]):
+            session["refreshed"] = time.time()
+            return True
+    except Exception as e:
+        log(repr(e), "DEBUG")
+    log(session["name"] + " was signed out. Signing in again.", "WARNING")
+    return openSession(daemon, session)
+
+
+def report(job, event):
+    """Tells the client that sent a course how it went."""
+    if job is not None:
+        job["events"].put(event)
+
+
+def backUpCourse(daemon, session, url, last_url):
+    """
+    Exports, downloads and checks one course with a session's browser.
+
+    Returns:
+    dict: A "done" or "failed" event for the client.
+
+    """
+    download_directory = daemon["download_directory"]
+    if not backups.getCourseExport(
+        session["driver"], url, last_url, session["directory"]
+    ):
+        return {"event": "failed", "url": url, "reason": "export or download failed"}
+
+    archive = os.path.join(
+        backups.downloadFolder(download_directory), backups.courseArchiveName(url)
+    )
+    os.replace(
+        os.path.join(
+            backups.downloadFolder(session["directory"]),
+            backups.courseArchiveName(url),
+        ),
+        archive,
+    )
+    # verifyCourse() writes the course up as done or failed itself.
+    if backups.verifyCourse(url, download_directory, None, []):
+        return {"event": "done", "url": url, "archive": archive}
+    return {"event": "failed", "url": url, "reason": "damaged export", "noted": True}
+
+
+def sessionWorker(daemon, session):
+    """
+    Backs up courses from the daemon's queue with one session's browser,
+    refreshing the session whenever it's been a while.
+
+    Returns:
+    void
+
+    """
+    last_url = ""
+    while not daemon["stopping"].is_set():
+        if time.time() - session["refreshed"] > refresh_interval:
+            if not refreshSession(daemon, session):
+                log(session["name"] + " is out of action.", "ERROR")
+                session["alive"] = False
+                failLeftovers(daemon)
+                return
+        try:
+            url, attempt, job = daemon["queue"].get(timeout=idle_check)
+        except queue.Empty:
+            continue
+
+        session["busy"] = url
+        try:
+            event = backUpCourse(daemon, session, url, last_url)
+        except Exception as e:
+            log(repr(e), "DEBUG")
+            event = {"event": "failed", "url": url, "reason": "browser error"}
+            # Make the next pass through the loop check on the browser.
+            session["refreshed"] = 0
+        session["busy"] = None
+        last_url = url
+
+        if event["event"] == "failed" and attempt < backups.max_session_attempts:
+            log("Could not download " + url + ", putting it back in the queue.")
+            backups.note(url, "queued", attempt=attempt + 1)
+            daemon["queue"].put((url, attempt + 1, job))
+            continue
+        if event["event"] == "failed" and not event.pop("noted", False):
+            backups.courseFailed(url, [], event["reason"])
+        with daemon["lock"]:
+            daemon[event["event"]] += 1
+        report(job, event)
+
+
+def failLeftovers(daemon):
+    """When no session is left, fails whatever is still queued."""
+    if any(s["alive"] for s in daemon["sessions"]):
+        return
+    while True:
+        try:
+            url, attempt, job = daemon["queue"].get_nowait()
+        except queue.Empty:
+            return
+        backups.courseFailed(url, [], "no signed-in sessions")
+        report(job, {"event": "failed", "url": url, "reason": "no signed-in sessions"})
+
+
+def status(daemon):
+    return {
+        "event": "status",
+        "uptime": round(time.time() - daemon["started"]),
+        "queued": daemon["queue"].qsize(),
+        "done": daemon["done"],
+        "failed": daemon["failed"],
+        "sessions": [
+            {
+                "name": s["name"],
+                "alive": s["alive"],
+                "busy": s["busy"],
+                "refreshed": round(time.time() - s["refreshed"]),
+            }
+            for s in daemon["sessions"]
+        ],
+    }
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Handles one client request. See backup_client.py for the messages."""
+
+    def send(self, message):
+        try:
+            backup_client.sendMessage(self.connection, message)
+        except OSError:
+            # The client went away. The courses still get backed up.
+            pass
+
+    def handle(self):
+        daemon = self.server.daemon
+        try:
+            message = json.loads(self.rfile.readline())
+        except ValueError:
+            self.send({"event": "error", "reason": "Couldn't read that request."})
+            return
+
+        command = message.get("command")
+        if command == "status":
+            self.send(status(daemon))
+        elif command == "stop":
+            self.send({"event": "finished", "summary": "Stopping the daemon."})
+            # shutdown() waits for serve_forever(), so it can't run on this thread.
+            threading.Thread(target=self.server.shutdown).start()
+        elif command == "backup":
+            self.backUp(daemon, message)
+        else:
+            self.send({"event": "error", "reason": "Unknown command: " + str(command)})
+
+    def backUp(self, daemon, message):
+        urls = [u.strip().rstrip("/") for u in message.get("urls", []) if u.strip()]
+        if not any(s["alive"] for s in daemon["sessions"]):
+            self.send({"event": "error", "reason": "No signed-in sessions."})
+            return
+        # Catch up on what's been learned about timing since the last job.
+        backups.wait_model = scheduler.makeModel(
+            scheduler.courseHistory(
+                self.server.metrics_path, backups.run_journal["path"]
+            )
+        )
+        job = {"events": queue.Queue()}
+        for url in urls:
+            backups.note(url, "queued")
+            daemon["queue"].put((url, 1, job))
+        log("Queued " + str(len(urls)) + " courses from a client.")
+        self.send({"event": "queued", "urls": urls})
+        if not message.get("wait", True):
+            return
+
+        started = time.time()
+        done = 0
+        for n in range(len(urls)):
+            event = job["events"].get()
+            done += event["event"] == "done"
+            self.send(event)
+        self.send(
+            {
+                "event": "finished",
+                "summary": str(done)
+                + " of "
+                + str(len(urls))
+                + " courses backed up in %.1f seconds." % (time.time() - started),
+            }
+        )
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def listen(daemon, socket_path, metrics_path):
+    """
+    Opens the socket. Only this user can connect to it.
+
+    Returns:
+    DaemonServer: The server, not started yet.
+
+    """
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    if os.path.exists(socket_path):
+        try:
+            list(backup_client.request({"command": "status"}, socket_path))
+            sys.exit("A backup daemon is already running at " + socket_path)
+        except backup_client.ClientError:
+            # Left over from a daemon that didn't shut down cleanly.
+            os.remove(socket_path)
+    old_umask = os.umask(0o077)
+    try:
+        server = DaemonServer(socket_path, RequestHandler)
+    finally:
+        os.umask(old_umask)
+    server.daemon = daemon
+    server.metrics_path = metrics_path
+    return server
+
+
+def main():
+    global refresh_interval
+    parser = argparse.ArgumentParser(usage=instructions, add_help=False)
+    parser.add_argument("-h", "--help", action="store_true")
+    parser.add_argument("-v", "--visible", action="store_true")
+    parser.add_argument("-c", "--chrome", action="store_true")
+    parser.add_argument("-d", "--download", action="store", default=None)
+    parser.add_argument("-n", "--sessions", action="store", type=int, default=2)
+    parser.add_argument("--socket", default=backup_client.default_socket)
+    parser.add_argument("--refresh", type=float, default=refresh_interval / 60)
+    parser.add_argument("--studio-url", action="store", default=None)
+    parser.add_argument("--journal", action="store", default=journal.default_journal)
+    parser.add_argument("--metrics", action="store", default=metrics.default_metrics)
+    parser.add_argument(
+        "--profile-template",
+        nargs="?",
+        const=browser_profile.default_templates,
+        default=None,
+    )
+    parser.add_argument("--fake-browser", nargs="?", const="", default=None)
+    parser.add_argument("--max-downloads", action="store", type=int, default=4)
+    parser.add_argument("--disk-reserve", action="store", type=float, default=1024)
+    parser.add_argument("--max-rate", action="store", type=float, default=None)
+    parser.add_argument("--lean", action="store_true")
+    parser.add_argument("--weigh-pages", action="store_true")
+    args = parser.parse_args()
+    if args.help:
+        sys.exit(instructions)
+
+    refresh_interval = args.refresh * 60
+    driver_choice = "chrome" if args.chrome else "firefox"
+    if args.fake_browser is not None:
+        log("Using the fake browser. Nothing here is real edX.")
+        driver_choice = "fake"
+        try:
+            fake_webdriver.configure(args.fake_browser)
+        except ValueError as e:
+            sys.exit(str(e))
+        username = password = "fake"
+    else:
+        print("""
+The daemon signs in once, and again whenever edX signs it out,
+so it keeps your password in memory while it runs.
+This user must have Admin status on all courses you send it.
+Press control-C to cancel.
+""")
+        username = input("User e-mail address: ")
+        password = getpass()
+
+    if args.studio_url is not None:
+        backups.useStudioURL(args.studio_url)
+    backups.profile_templates = args.profile_template
+    backups.lean_mode = args.lean
+    if args.lean or args.weigh_pages:
+        backups.page_weights = lean_browser.openWeights()
+    backups.download_admission = backups.makeAdmission(
+        args.download, args.disk_reserve, args.max_downloads, args.max_rate
+    )
+    backups.run_journal = journal.openJournal(args.journal)
+    backups.run_metrics = metrics.openMetrics(args.metrics, backups.run_journal["run"])
+
+    daemon = newDaemon(args, driver_choice, username, password)
+    server = listen(daemon, args.socket, args.metrics)
+
+    # Sign in once, and copy that login to the other browsers.
+    cookies = None
+    for n in range(max(args.sessions, 1)):
+        session = {
+            "name": "session " + str(n),
+            "directory": os.path.join(args.download or "", "daemon_" + str(n)),
+            "driver": None,
+            "refreshed": 0,
+            "busy": None,
+            "alive": True,
+        }
+        if not openSession(daemon, session, cookies):
+            for s in daemon["sessions"] + [session]:
+                if s["driver"] is not None:
+                    s["driver"].quit()
+            server.server_close()
+            os.remove(args.socket)
+            sys.exit("Couldn't sign in to Studio.")
+        if cookies is None and args.sessions > 1:
+            cookies = backups.collectSessionCookies(session["driver"])
+            backups.openStudioHome(session["driver"])
+        daemon["sessions"].append(session)
+
+    workers = []
+    for session in daemon["sessions"]:
+        worker = threading.Thread(
+            target=sessionWorker, args=(daemon, session), daemon=True
+        )
+        workers.append(worker)
+        worker.start()
+
+    # Stop cleanly on kill, the same as on control-C.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    log(
+        "Backup daemon ready with "
+        + str(len(daemon["sessions"]))
+        + " sessions at "
+        + args.socket
+    )
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        log("Backup daemon stopping. Finishing the courses in progress.")
+        daemon["stopping"].set()
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        for worker in workers:
+            worker.join()
+        for session in daemon["sessions"]:
+            if session["driver"] is not None:
+                session["driver"].quit()
+        metrics.closeMetrics(backups.run_metrics)
+
+
+if __name__ == "__main__":
+    main()
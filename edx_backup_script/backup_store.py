@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+# A deduplicated store for course exports.
+#
+# Each file inside an export is saved once, under the SHA-256 of its contents,
+# so reruns of the same course only add the files that actually changed.
+# Each backup is a small manifest listing its files, with enough detail
+# to rebuild the original .tar.gz byte for byte.
+#
+# store/
+#   objects/ab/abcdef...        zlib-compressed file contents
+#   manifests/MUS24.6x_2T2023/  one JSON manifest per backup of that course
+
+import os
+import sys
+import gzip
+import json
+import zlib
+import base64
+import struct
+import hashlib
+import argparse
+import tempfile
+
+instructions = """
+to run:
+python3 backup_store.py add store_folder MUS24.6x_2T2023.tar.gz (more files...)
+python3 backup_store.py restore store_folder manifest.json output.tar.gz
+python3 backup_store.py list store_folder
+"""
+
+block_size = 512
+chunk_size = 1024 * 1024
+# Files bigger than this go through a temp file instead of memory.
+max_in_memory = 8 * 1024 * 1024
+# Tar entry types whose data is file contents. Everything else is metadata.
+file_types = [b"0", b"\0", b"7"]
+
+
+def b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def unb64(text):
+    return base64.b64decode(text.encode("ascii"))
+
+
+def objectPath(store, digest):
+    return os.path.join(store, "objects", digest[:2], digest)
+
+
+def readExactly(f, size):
+    """Reads size bytes, or fewer only if the stream ends."""
+    pieces = []
+    while size > 0:
+        piece = f.read(min(size, chunk_size))
+        if not piece:
+            break
+        pieces.append(piece)
+        size -= len(piece)
+    return b"".join(pieces)
+
+
+def tarEntrySize(header):
+    """Reads the size field of a tar header, in octal or GNU base-256."""
+    field = header[124:136]
+    if field[0] & 0x80:
+        return int.from_bytes(field[1:], "big")
+    digits = field.replace(b"\0", b" ").strip()
+    return int(digits, 8) if digits else 0
+
+
+def parseGzipHeader(f):
+    """
+    Reads the gzip header from the start of a file, so we can write it back
+    exactly. See RFC 1952.
+
+    Returns:
+    bytes: The raw header.
+
+    """
+    header = f.read(10)
+    if len(header) < 10 or header[:2] != b"\x1f\x8b":
+        raise ValueError("Not a gzip file")
+    flags = header[3]
+    if flags & 4:  # FEXTRA
+        extra_length = f.read(2)
+        header += extra_length + f.read(struct.unpack("<H", extra_length)[0])
+    for flag in [8, 16]:  # FNAME, FCOMMENT
+        if flags & flag:
+            while True:
+                byte = f.read(1)
+                header += byte
+                if byte in [b"\0", b""]:
+                    break
+    if flags & 2:  # FHCRC
+        header += f.read(2)
+    return header
+
+
+def compressionLevels(gzip_header):
+    """Which zlib levels to try when rebuilding, going by the XFL byte."""
+    if gzip_header[8] == 2:
+        return [9]
+    if gzip_header[8] == 4:
+        return [1]
+    return [6, 9]
+
+
+def putObject(store, f, size):
+    """
+    Copies the next size bytes of f into the store, unless they're already there.
+
+    Returns:
+    tuple: (SHA-256 of the contents, bytes written to the store)
+
+    """
+    digest = hashlib.sha256()
+    if size <= max_in_memory:
+        data = readExactly(f, size)
+        digest.update(data)
+        path = objectPath(store, digest.hexdigest())
+        if os.path.exists(path):
+            return digest.hexdigest(), 0
+        compressed = zlib.compress(data, 6)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as t:
+            t.write(compressed)
+        os.replace(t.name, path)
+        return digest.hexdigest(), len(compressed)
+
+    # Big files: compress to a temp file while hashing, keep it only if it's new.
+    compressor = zlib.compressobj(6)
+    written = 0
+    objects = os.path.join(store, "objects")
+    with tempfile.NamedTemporaryFile(dir=objects, delete=False) as t:
+        remaining = size
+        while remaining > 0:
+            piece = f.read(min(remaining, chunk_size))
+            if not piece:
+                break
+            remaining -= len(piece)
+            digest.update(piece)
+            written += t.write(compressor.compress(piece))
+        written += t.write(compressor.flush())
+    path = objectPath(store, digest.hexdigest())
+    if os.path.exists(path):
+        os.remove(t.name)
+        return digest.hexdigest(), 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(t.name, path)
+    return digest.hexdigest(), written
+
+
+def readObject(store, digest):
+    """Yields the contents of an object in chunks."""
+    decompressor = zlib.decompressobj()
+    with open(objectPath(store, digest), "rb") as f:
+        while True:
+            piece = f.read(chunk_size)
+            if not piece:
+                break
+            yield decompressor.decompress(piece)
+    yield decompressor.flush()
+
+
+def tarStream(store, manifest):
+    """Yields the uncompressed tar file described by a manifest, in chunks."""
+    for member in manifest["members"]:
+        yield unb64(member["header"])
+        if member["object"] is not None:
+            for piece in readObject(store, member["object"]):
+                yield piece
+            padding = -member["size"] % block_size
+            yield b"\0" * padding
+    yield unb64(manifest["trailer"])
+
+
+def zeroPaddedTar(archive):
+    """
+    Yields the tar inside a .tar.gz the way tarStream() would rebuild it
+    from the store: the same headers, contents and trailer, but always
+    zeros for padding. Nothing goes into the store.
+    """
+    with gzip.open(archive, "rb") as tar:
+        while True:
+            header = readExactly(tar, block_size)
+            if len(header) < block_size or header == b"\0" * block_size:
+                yield header + tar.read()
+                return
+            size = tarEntrySize(header)
+            padded = size + (-size % block_size)
+            yield header
+            if header[156:157] in file_types:
+                remaining = size
+                while remaining > 0:
+                    piece = tar.read(min(remaining, chunk_size))
+                    if not piece:
+                        # Cut short, so it won't match the original anyway.
+                        return
+                    remaining -= len(piece)
+                    yield piece
+                readExactly(tar, padded - size)
+                yield b"\0" * (padded - size)
+            else:
+                yield readExactly(tar, padded)
+
+
+def gzipStream(store, manifest, level):
+    """Yields a rebuilt .tar.gz, in chunks."""
+    return compressTar(
+        unb64(manifest["gzip_header"]), tarStream(store, manifest), level
+    )
+
+
+def compressTar(gzip_header, pieces, level):
+    """Yields a .tar.gz made from a gzip header and the tar's pieces."""
+    yield gzip_header
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    crc = 0
+    length = 0
+    for piece in pieces:
+        crc = zlib.crc32(piece, crc)
+        length += len(piece)
+        yield compressor.compress(piece)
+    yield compressor.flush()
+    yield struct.pack("<II", crc & 0xFFFFFFFF, length & 0xFFFFFFFF)
+
+
+def fileHash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for piece in iter(lambda: f.read(chunk_size), b""):
+            digest.update(piece)
+    return digest.hexdigest()
+
+
+def addArchive(store, archive):
+    """
+    Unpacks a course export into the store and writes its manifest.
+
+    Parameters:
+    store (str): The store folder.
+    archive (str): A .tar.gz course export.
+
+    Returns:
+    dict: The manifest, plus "path" (where it was saved) and
+          "bytes_written" (how much new data went into the store).
+
+    """
+    os.makedirs(os.path.join(store, "objects"), exist_ok=True)
+    name = os.path.basename(archive)
+    archive_hash = fileHash(archive)
+    with open(archive, "rb") as f:
+        gzip_header = parseGzipHeader(f)
+
+    # Make sure we can rebuild the exact same bytes before putting
+    # anything in the store.
+    level = None
+    for candidate in compressionLevels(gzip_header):
+        rebuilt = hashlib.sha256()
+        for piece in compressTar(gzip_header, zeroPaddedTar(archive), candidate):
+            rebuilt.update(piece)
+        if rebuilt.hexdigest() == archive_hash:
+            level = candidate
+            break
+
+    members = []
+    trailer = b""
+    bytes_written = 0
+    original = None
+    if level is None:
+        # Some other gzip made this, or its padding isn't zeros.
+        # Keep the original whole; it still dedups.
+        with open(archive, "rb") as f:
+            original, bytes_written = putObject(store, f, os.path.getsize(archive))
+    else:
+        members, trailer, bytes_written = storeMembers(store, archive)
+
+    manifest = {
+        "archive": name,
+        "sha256": archive_hash,
+        "size": os.path.getsize(archive),
+        "gzip_header": b64(gzip_header),
+        "members": members,
+        "trailer": b64(trailer),
+        "level": level,
+        "original": original,
+    }
+
+    manifest_folder = os.path.join(store, "manifests", name.split(".tar")[0])
+    os.makedirs(manifest_folder, exist_ok=True)
+    manifest_path = os.path.join(manifest_folder, archive_hash[:16] + ".json")
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+
+    manifest["path"] = manifest_path
+    manifest["bytes_written"] = bytes_written
+    return manifest
+
+
+def storeMembers(store, archive):
+    """
+    Puts each file in a .tar.gz into the store.
+
+    Returns:
+    tuple: (the manifest's member list, the tar's trailer,
+            bytes written to the store)
+
+    """
+    members = []
+    bytes_written = 0
+    with gzip.open(archive, "rb") as tar:
+        while True:
+            header = readExactly(tar, block_size)
+            if len(header) < block_size or header == b"\0" * block_size:
+                # End of archive. Keep the zero blocks and any padding as-is.
+                trailer = header + tar.read()
+                break
+
+            size = tarEntrySize(header)
+            padded = size + (-size % block_size)
+            if header[156:157] in file_types:
+                digest, written = putObject(store, tar, size)
+                bytes_written += written
+                readExactly(tar, padded - size)
+                members.append({"header": b64(header), "object": digest, "size": size})
+            else:
+                # Directories, links, and long-name or pax records.
+                # Their data is small, so it goes in the manifest.
+                header += readExactly(tar, padded)
+                members.append({"header": b64(header), "object": None, "size": 0})
+    return members, trailer, bytes_written
+
+
+def restoreArchive(store, manifest_path, destination):
+    """
+    Rebuilds a .tar.gz from its manifest and checks it against the original hash.
+
+    Returns:
+    bool: True if the rebuilt file matches.
+
+    """
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+
+    if manifest["original"] is not None:
+        pieces = readObject(store, manifest["original"])
+    else:
+        pieces = gzipStream(store, manifest, manifest["level"])
+
+    digest = hashlib.sha256()
+    with open(destination, "wb") as out:
+        for piece in pieces:
+            digest.update(piece)
+            out.write(piece)
+    return digest.hexdigest() == manifest["sha256"]
+
+
+def listBackups(store):
+    """
+    Returns:
+    list: Paths of every manifest in the store.
+
+    """
+    manifests = []
+    for folder, _, files in os.walk(os.path.join(store, "manifests")):
+        manifests.extend(os.path.join(folder, f) for f in files if f.endswith(".json"))
+    return sorted(manifests)
+
+
+def main():
+    parser = argparse.ArgumentParser(usage=instructions)
+    parser.add_argument("command", choices=["add", "restore", "list"])
+    parser.add_argument("store")
+    parser.add_argument("files", nargs="*")
+    args = parser.parse_args()
+
+    if args.command == "add":
+        for archive in args.files:
+            manifest = addArchive(args.store, archive)
+            print(
+                archive
+                + ": "
+                + str(manifest["bytes_written"])
+                + " new bytes stored for "
+                + str(manifest["size"])
+                + " byte archive."
+            )
+            if manifest["original"] is not None:
+                print("  (couldn't rebuild this one exactly, kept the original)")
+    elif args.command == "restore":
+        if len(args.files) != 2:
+            sys.exit(instructions)
+        if restoreArchive(args.store, args.files[0], args.files[1]):
+            print("Restored " + args.files[1])
+        else:
+            sys.exit("Restored file doesn't match the original: " + args.files[1])
+    else:
+        for manifest in listBackups(args.store):
+            print(manifest)
+
+
+if __name__ == "__main__":
+    main()
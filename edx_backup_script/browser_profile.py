@@ -0,0 +1,208 @@
+# A browser profile that's set up once and copied for each browser we start,
+# instead of having every browser make a blank profile from scratch.
+#
+# The template has downloads set up, has telemetry, safe browsing,
+# updates and first-run pages turned off, and has been used once
+# to load the edX login page so its caches are already full.
+# Copies are made with reflinks (copy-on-write) where the file system
+# has them, so they're nearly free; otherwise it's a normal copy.
+#
+# The template lives in ~/.edx_backup/profiles/ by default.
+# Delete it to have it built again.
+
+import os
+import sys
+import json
+import time
+import atexit
+import shutil
+import tempfile
+import subprocess
+
+default_templates = os.path.join(os.path.expanduser("~"), ".edx_backup", "profiles")
+marker_file = "edx_backup_template.json"
+# Bump this when the prefs change, so old templates get rebuilt.
+template_version = 1
+
+# Firefox prefs for the template. The download folder is set per browser.
+firefox_prefs = {
+    # Save exports without asking.
+    "browser.download.folderList": 2,
+    "browser.download.useDownloadDir": True,
+    "browser.download.manager.showWhenStarting": False,
+    "browser.download.alwaysOpenPanel": False,
+    "browser.helperApps.neverAsk.saveToDisk": "application/gzip,application/x-gzip,"
+    "application/x-tar,application/octet-stream,binary/octet-stream",
+    # No telemetry or crash reports.
+    "toolkit.telemetry.enabled": False,
+    "toolkit.telemetry.unified": False,
+    "toolkit.telemetry.archive.enabled": False,
+    "datareporting.healthreport.uploadEnabled": False,
+    "datareporting.policy.dataSubmissionEnabled": False,
+    "browser.crashReports.unsubmittedCheck.autoSubmit2": False,
+    "app.shield.optoutstudies.enabled": False,
+    "app.normandy.enabled": False,
+    # No safe browsing lookups. Every download would wait on one.
+    "browser.safebrowsing.malware.enabled": False,
+    "browser.safebrowsing.phishing.enabled": False,
+    "browser.safebrowsing.downloads.enabled": False,
+    "browser.safebrowsing.downloads.remote.enabled": False,
+    "browser.safebrowsing.blockedURIs.enabled": False,
+    # No updates, of Firefox or its add-ons.
+    "app.update.auto": False,
+    "app.update.enabled": False,
+    "extensions.update.enabled": False,
+    "extensions.getAddons.cache.enabled": False,
+    "extensions.pocket.enabled": False,
+    "extensions.screenshots.disabled": True,
+    # No first-run, what's-new, or start pages.
+    "browser.shell.checkDefaultBrowser": False,
+    "browser.startup.homepage_override.mstone": "ignore",
+    "startup.homepage_welcome_url": "about:blank",
+    "startup.homepage_welcome_url.additional": "",
+    "browser.startup.page": 0,
+    "browser.newtabpage.enabled": False,
+    "browser.aboutwelcome.enabled": False,
+    "trailhead.firstrun.didSeeAboutWelcome": True,
+    "datareporting.policy.firstRunURL": "",
+    # Nothing else phoning home while we work.
+    "network.captive-portal-service.enabled": False,
+    "network.connectivity-service.enabled": False,
+    "browser.ping-centre.telemetry": False,
+    "media.gmp-manager.updateEnabled": False,
+}
+
+# Chrome command-line switches for the same things.
+chrome_arguments = [
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-sync",
+    "--disable-features=Translate,OptimizationHints,MediaRouter",
+    "--safebrowsing-disable-download-protection",
+    "--metrics-recording-only",
+]
+
+# Firefox won't open a profile that looks like it's in use.
+lock_files = ["lock", ".parentlock", "parent.lock", "SingletonLock"]
+
+# Copies to delete when we're done.
+clones = []
+
+
+class ProfileError(Exception):
+    pass
+
+
+def templateFolder(browser, templates=default_templates):
+    return os.path.join(templates, browser)
+
+
+def userJS(prefs):
+    """Prefs in the form Firefox reads from user.js."""
+    lines = []
+    for name, value in prefs.items():
+        lines.append("user_pref(" + json.dumps(name) + ", " + json.dumps(value) + ");")
+    return "\n".join(lines) + "\n"
+
+
+def templateReady(template, browser):
+    """True if the template exists and was built from the current prefs."""
+    try:
+        with open(os.path.join(template, marker_file), "r") as f:
+            marker = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return (
+        marker.get("browser") == browser and marker.get("version") == template_version
+    )
+
+
+def buildTemplate(template, browser, warm_up=None):
+    """
+    Makes a fresh profile template.
+
+    Parameters:
+    template (str): The folder to build it in. Anything there is replaced.
+    browser (str): "firefox" or "chrome".
+    warm_up (function): Called with the profile folder. Should start the
+                        browser on it, load a page or two, and quit,
+                        so the caches are full. Optional.
+
+    """
+    if os.path.exists(template):
+        shutil.rmtree(template)
+    os.makedirs(template)
+    if warm_up is not None:
+        warm_up(template)
+    # Written after the warm-up too, since geckodriver adds its own prefs to user.js.
+    if browser == "firefox":
+        with open(os.path.join(template, "user.js"), "w") as f:
+            f.write(userJS(firefox_prefs))
+    removeLocks(template)
+    with open(os.path.join(template, marker_file), "w") as f:
+        json.dump(
+            {"browser": browser, "version": template_version, "built": time.time()}, f
+        )
+
+
+def removeLocks(profile):
+    for name in lock_files:
+        path = os.path.join(profile, name)
+        if os.path.lexists(path):
+            os.remove(path)
+
+
+def copyCommand(source, destination):
+    """
+    The cp command that makes a copy-on-write clone, if this system has one.
+
+    Returns:
+    list: The command, or None.
+
+    """
+    if sys.platform.startswith("linux"):
+        return ["cp", "-R", "--reflink=auto", source, destination]
+    if sys.platform == "darwin":
+        # -c clones files on APFS.
+        return ["cp", "-R", "-c", source, destination]
+    return None
+
+
+def cloneProfile(template):
+    """
+    Copies the template into a new temporary folder for one browser.
+    The copy is deleted when the script exits.
+
+    Returns:
+    str: The new profile folder.
+
+    """
+    destination = os.path.join(
+        tempfile.mkdtemp(prefix="edx_backup_profile_"), "profile"
+    )
+    command = copyCommand(template, destination)
+    copied = False
+    if command is not None:
+        try:
+            copied = subprocess.run(command, capture_output=True).returncode == 0
+        except OSError:
+            copied = False
+    if not copied:
+        shutil.rmtree(destination, ignore_errors=True)
+        try:
+            shutil.copytree(template, destination)
+        except (OSError, shutil.Error) as e:
+            raise ProfileError("Couldn't copy profile template: " + str(e))
+    removeLocks(destination)
+    clones.append(os.path.dirname(destination))
+    return destination
+
+
+def removeClones():
+    while clones:
+        shutil.rmtree(clones.pop(), ignore_errors=True)
+
+
+atexit.register(removeClones)
@@ -0,0 +1,289 @@
+# Downloads course exports straight over HTTP,
+# without going through the browser's download manager.
+
+import os
+import re
+import sys
+import time
+import ctypes
+import select
+import struct
+import urllib3
+
+
+def makePool(size):
+    """A connection pool that keeps up to size connections open per host."""
+    return urllib3.PoolManager(maxsize=size, block=False)
+
+
+# One connection pool for the whole run, so repeat downloads from
+# the same S3 bucket can reuse their connections.
+http = makePool(10)
+
+chunk_size = 1024 * 1024  # bytes
+max_download_retries = 5
+
+
+# What's worth trying again. Other OSErrors, like a full disk
+# or a missing folder, would only fail the same way again.
+network_errors = (urllib3.exceptions.HTTPError, ConnectionError, TimeoutError)
+
+
+class DownloadError(Exception):
+    pass
+
+
+def totalSize(response, already_have):
+    """
+    Works out how big the whole file is from the response headers.
+
+    Returns:
+    int: The full size in bytes, or None if the server didn't say.
+
+    """
+    # Partial content looks like this: Content-Range: bytes 100-999/1000
+    content_range = response.headers.get("Content-Range")
+    if content_range is not None:
+        match = re.match(r"bytes \d+-\d+/(\d+)", content_range)
+        if match:
+            return int(match.group(1))
+    content_length = response.headers.get("Content-Length")
+    if content_length is not None:
+        return already_have + int(content_length)
+    return None
+
+
+def streamDownload(
+    url,
+    destination,
+    headers=None,
+    pool=None,
+    on_chunk=None,
+    on_size=None,
+    throttle=None,
+):
+    """
+    Downloads a file in chunks to destination + ".part",
+    then renames it once every byte has arrived.
+    Dropped connections pick up where they left off with a Range request.
+    There's no overall time limit, only a limit on how long one read can stall.
+    Trouble on our end, like a full disk, isn't retried.
+
+    Parameters:
+    url (str): What to download.
+    destination (str): The final path for the file.
+    headers (dict): Extra request headers, like cookies.
+    pool (urllib3.PoolManager): Connection pool to use. Defaults to ours.
+    on_chunk (function): Called as on_chunk(offset, chunk) after each chunk
+                         is written, so it can be checked while we download.
+    on_size (function): Called with the full size in bytes once the server
+                        says, before anything is written. It can raise to
+                        stop the download.
+    throttle (function): Called with each chunk's length before it's written,
+                         so it can sleep to keep us under a bandwidth limit.
+
+    Returns:
+    int: The size of the finished file in bytes.
+
+    """
+    pool = pool or http
+    partial = destination + ".part"
+    folder = os.path.dirname(destination)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    # Don't resume a leftover file from some earlier run.
+    if os.path.exists(partial):
+        os.remove(partial)
+
+    expected_size = None
+    retries = 0
+    while True:
+        have = os.path.getsize(partial) if os.path.exists(partial) else 0
+        request_headers = dict(headers or {})
+        if have > 0:
+            request_headers["Range"] = "bytes=" + str(have) + "-"
+
+        try:
+            response = pool.request(
+                "GET",
+                url,
+                headers=request_headers,
+                preload_content=False,
+                retries=False,
+                timeout=urllib3.Timeout(connect=30, read=120),
+            )
+            try:
+                if response.status == 206:
+                    mode = "ab"
+                elif response.status == 200:
+                    # The server ignored our Range header, so start over.
+                    mode = "wb"
+                    have = 0
+                else:
+                    raise DownloadError(
+                        "HTTP " + str(response.status) + " downloading " + url
+                    )
+                expected_size = totalSize(response, have)
+                if on_size is not None and expected_size is not None:
+                    try:
+                        on_size(expected_size)
+                    except Exception:
+                        # Whatever we had so far isn't going to be finished.
+                        if os.path.exists(partial):
+                            os.remove(partial)
+                        raise
+
+                with open(partial, mode) as f:
+                    for chunk in response.stream(chunk_size):
+                        if throttle is not None:
+                            throttle(len(chunk))
+                        f.write(chunk)
+                        if on_chunk is not None:
+                            on_chunk(have, chunk)
+                        have += len(chunk)
+            finally:
+                response.release_conn()
+
+        except network_errors as e:
+            retries += 1
+            if retries > max_download_retries:
+                raise DownloadError("Gave up downloading " + url + ": " + repr(e))
+            time.sleep(2**retries)
+            continue
+
+        have = os.path.getsize(partial)
+        if expected_size is None or have == expected_size:
+            break
+        if have > expected_size:
+            raise DownloadError(
+                "Got " + str(have) + " bytes, expected " + str(expected_size)
+            )
+
+        # The connection closed early. Ask for the rest.
+        retries += 1
+        if retries > max_download_retries:
+            raise DownloadError("Gave up downloading " + url + " after short reads")
+
+    os.replace(partial, destination)
+    return have
+
+
+# Browsers write to one of these while the download is still going.
+partial_suffixes = [".part", ".crdownload"]
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+inotify_event_header = struct.Struct("iIII")
+
+
+def loadLibc():
+    """
+    Finds the C library's inotify functions, once, when this module loads.
+    CDLL(None) looks in what's already loaded, so unlike
+    ctypes.util.find_library() it doesn't start an ldconfig subprocess.
+
+    Returns:
+    ctypes.CDLL: The C library, or None where inotify isn't available.
+
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, "inotify_init1"):
+        return None
+    return libc
+
+
+libc = loadLibc()
+
+
+def downloadFinished(path):
+    """A download is done when the file has data and its partial file is gone."""
+    if not os.path.isfile(path) or os.path.getsize(path) == 0:
+        return False
+    return not any(os.path.exists(path + suffix) for suffix in partial_suffixes)
+
+
+def inotifyWatch(folder):
+    """
+    Starts watching a folder with Linux inotify.
+
+    Returns:
+    int: The inotify file descriptor, or None where inotify isn't available.
+
+    """
+    if libc is None:
+        return None
+
+    fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+        return None
+    mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    if libc.inotify_add_watch(fd, os.fsencode(folder), mask) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def readInotifyNames(fd):
+    """Reads all waiting inotify events and returns the filenames they mention."""
+    names = set()
+    try:
+        data = os.read(fd, 64 * 1024)
+    except BlockingIOError:
+        return names
+    offset = 0
+    while offset < len(data):
+        wd, mask, cookie, length = inotify_event_header.unpack_from(data, offset)
+        offset += inotify_event_header.size
+        names.add(os.fsdecode(data[offset : offset + length].rstrip(b"\0")))
+        offset += length
+    return names
+
+
+def waitForDownload(folder, filename, timeout):
+    """
+    Waits for the browser to finish writing a file.
+    Uses inotify on Linux so we wake up as soon as the file is closed,
+    and checks once a second everywhere else.
+
+    Parameters:
+    folder (str): The browser's download folder.
+    filename (str): The name the finished file will have.
+    timeout (float): Seconds to wait before giving up.
+
+    Returns:
+    str: The path to the finished file, or None if it never finished.
+
+    """
+    path = os.path.join(folder, filename)
+    deadline = time.time() + timeout
+
+    fd = inotifyWatch(folder)
+    try:
+        # Check after the watch is set up, so we can't miss it finishing.
+        while not downloadFinished(path):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            if fd is None:
+                time.sleep(min(1, remaining))
+                continue
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if ready:
+                # Empty the queue. We check the file itself either way.
+                readInotifyNames(fd)
+    finally:
+        if fd is not None:
+            os.close(fd)
+
+    return path
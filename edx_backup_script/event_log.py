@@ -0,0 +1,78 @@
+# Logging for the backup script that doesn't hold up the work.
+#
+# log() calls just drop the record on a queue. A background thread
+# writes it to the screen and to the log file, one JSON object per line,
+# like this:
+# {"time": "2024-05-08T14:02:11.532", "level": "INFO", "function": "courseDone",
+#  "message": "Downloaded https://...", "course": "course-v1:HarvardX+CS109xa+3T2023",
+#  "phase": "downloading", "attempt": 1, "duration": 41.2}
+#
+# The log file rolls over to edx_backup.log.1, .2, ... when it gets big,
+# instead of being trimmed at startup.
+
+import sys
+import json
+import queue
+import atexit
+import logging
+import datetime
+import logging.handlers
+
+default_log = "edx_backup.log"
+max_log_bytes = 10 * 1024 * 1024
+log_backups = 5
+
+# Extra fields a log() call can attach, for reading the log by machine.
+event_fields = ["course", "phase", "attempt", "duration"]
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        event = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "function": record.funcName,
+            "message": record.getMessage(),
+        }
+        for field in event_fields:
+            value = getattr(record, field, None)
+            if value is not None:
+                event[field] = value
+        return json.dumps(event)
+
+
+def startLogging(logger, log_file=default_log):
+    """
+    Sends a logger's records through a queue to a background writer.
+
+    Parameters:
+    logger (logging.Logger): The logger to set up.
+    log_file (str): Where to write the JSON lines.
+
+    Returns:
+    logging.handlers.QueueListener: The background writer.
+                                    It's stopped, and flushed, at exit.
+
+    """
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=max_log_bytes, backupCount=log_backups
+    )
+    file_handler.setFormatter(JSONFormatter())
+    screen_handler = logging.StreamHandler(sys.stdout)
+    screen_handler.setFormatter(logging.Formatter("%(message)s"))
+    # Details like repr(e) only go to the file.
+    screen_handler.setLevel(logging.INFO)
+
+    records = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    # Don't send everything to the root logger's handlers too.
+    logger.propagate = False
+
+    listener = logging.handlers.QueueListener(
+        records, file_handler, screen_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,359 @@
+# A pretend browser with just enough of Selenium's WebDriver API
+# to run the backup script without Firefox or Chrome.
+# It never touches the network. It acts out edX instead: the login page,
+# Studio home, course outlines, export pages, and downloads that land
+# in the download folder like a real browser's.
+#
+# Each page and button takes a while, and things can be set to fail
+# now and then, so the rest of the script gets exercised properly.
+# Use it with --fake-browser, optionally with settings like
+# --fake-browser "export_time=30,download_failure=0.05"
+
+import io
+import os
+import time
+import random
+import hashlib
+import tarfile
+import threading
+from urllib.parse import urlparse, urljoin
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.command import Command
+from selenium.webdriver.remote.webelement import WebElement
+from selenium.common import exceptions as selenium_exceptions
+
+# Seconds things take, bytes of filler in each export,
+# and the chance (0 to 1) of each kind of failure.
+settings = {
+    "page_load": 0.05,
+    "click": 0.01,
+    "export_time": 2.0,
+    "download_time": 0.1,
+    "size": 0,
+    "login_failure": 0.0,
+    "page_failure": 0.0,
+    "export_failure": 0.0,
+    "download_failure": 0.0,
+}
+
+# What each locator the script uses finds, and on which page.
+elements = {
+    (By.CSS_SELECTOR, "#emailOrUsername"): ("login", "username"),
+    (By.CSS_SELECTOR, "#password"): ("login", "password"),
+    (By.CSS_SELECTOR, "#sign-in"): ("login", "sign_in"),
+    (By.CSS_SELECTOR, "#login-failure-alert"): ("login", "login_failure"),
+    (By.ID, "pgn-searchfield-input-1"): ("home", "search"),
+    (By.CSS_SELECTOR, "#Tools-dropdown-menu"): ("outline", "tools"),
+    (By.XPATH, "//a[text()='Export Course']"): ("outline", "export_link"),
+    (By.XPATH, "//button[text()='Export course content']"): ("export", "export"),
+    (By.CSS_SELECTOR, "div.course-stepper"): ("export", "stepper"),
+    (By.XPATH, "//a[text()='Download exported course']"): ("export", "download"),
+}
+
+# edX's side of things, shared by every fake browser, like the real edX.
+# course key -> when its export will be ready
+exports = {}
+exports_lock = threading.Lock()
+
+
+def configure(text):
+    """
+    Changes settings from a string like "export_time=30,page_failure=0.1".
+
+    Returns:
+    dict: The settings.
+
+    """
+    for pair in filter(None, (text or "").split(",")):
+        name, _, value = pair.partition("=")
+        name = name.strip()
+        if name not in settings:
+            raise ValueError("Unknown fake browser setting: " + name)
+        settings[name] = type(settings[name])(float(value))
+    return settings
+
+
+def unlucky(failure):
+    return random.random() < settings[failure]
+
+
+def courseKey(url):
+    return url.rstrip("/").split("/course/")[-1].split("/")[0]
+
+
+def exportFilename(course_key):
+    """Studio names exports like course.zibb8idm.tar.gz"""
+    return (
+        "course." + hashlib.sha1(course_key.encode("utf-8")).hexdigest()[:8] + ".tar.gz"
+    )
+
+
+def courseTarball(course_key, size):
+    """A small but complete course export, as .tar.gz bytes."""
+    org, course, run = course_key.split(":")[-1].split("+")
+    files = {
+        "course/course.xml": '<course url_name="%s" org="%s" course="%s"/>\n'
+        % (run, org, course),
+        "course/course/%s.xml" % run: '<course display_name="%s"/>\n' % course,
+    }
+    if size > 0:
+        files["course/static/filler.bin"] = "x" * size
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for name, text in files.items():
+            data = text.encode("utf-8")
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def pageFor(url, signed_in):
+    """Works out which page a URL shows."""
+    path = urlparse(url).path.rstrip("/")
+    if path.endswith("/login"):
+        return "login"
+    if path.endswith("/robots.txt"):
+        return "robots"
+    if not signed_in:
+        return "login"
+    if path.endswith("/home"):
+        return "home"
+    if "/course/" in path and path.endswith("/export"):
+        return "export"
+    if "/course/" in path:
+        return "outline"
+    return "blank"
+
+
+class FakeElement(WebElement):
+    """One element on a fake page. Clicking it tells the driver."""
+
+    def __init__(self, driver, name):
+        super().__init__(driver, name)
+        self.name = name
+
+    def is_displayed(self):
+        return self._parent.isVisible(self.name)
+
+    def click(self):
+        self._parent.clickElement(self.name)
+
+    def clear(self):
+        pass
+
+    def send_keys(self, *value):
+        time.sleep(settings["click"])
+
+    def get_attribute(self, name):
+        if self.name == "download" and name == "href":
+            return self._parent.downloadLink()
+        return None
+
+    @property
+    def text(self):
+        return self.name
+
+
+class FakeSwitchTo:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def new_window(self, type_hint=None):
+        self.driver.openTab()
+
+    def window(self, handle):
+        if handle not in self.driver.tabs:
+            raise selenium_exceptions.NoSuchWindowException(handle)
+        self.driver.current_window_handle = handle
+
+
+class FakeWebDriver:
+    """
+    Stands in for selenium's Firefox or Chrome WebDriver.
+
+    Parameters:
+    download_folder (str): Where "downloaded" exports are written.
+
+    """
+
+    def __init__(self, download_folder):
+        self.session_id = "fake-" + str(id(self))
+        self.download_folder = download_folder
+        self.implicit_wait = 0
+        self.cookies = {}
+        self.tabs = {}
+        self.tab_count = 0
+        self.switch_to = FakeSwitchTo(self)
+        self.current_window_handle = None
+        self.openTab()
+
+    # Tabs. Each one remembers its page and what's been clicked on it.
+    def openTab(self):
+        self.tab_count += 1
+        handle = "tab-" + str(self.tab_count)
+        self.tabs[handle] = {"url": "about:blank", "page": "blank", "clicked": set()}
+        self.current_window_handle = handle
+
+    @property
+    def tab(self):
+        if self.current_window_handle not in self.tabs:
+            raise selenium_exceptions.NoSuchWindowException("That tab is closed.")
+        return self.tabs[self.current_window_handle]
+
+    @property
+    def window_handles(self):
+        return list(self.tabs)
+
+    @property
+    def current_url(self):
+        return self.tab["url"]
+
+    @property
+    def title(self):
+        return self.tab["page"].title()
+
+    def signedIn(self):
+        return "sessionid" in self.cookies
+
+    def get(self, url):
+        time.sleep(settings["page_load"])
+        page = pageFor(url, self.signedIn())
+        if page == "login" and pageFor(url, True) != "login":
+            # Not signed in, so edX sends us to the login page.
+            url = urljoin(url, "/login")
+        if page in ["outline", "export"] and unlucky("page_failure"):
+            page = "broken"
+        self.tabs[self.current_window_handle] = {
+            "url": url,
+            "page": page,
+            "clicked": set(),
+        }
+
+    def close(self):
+        del self.tabs[self.current_window_handle]
+
+    def quit(self):
+        self.tabs = {}
+
+    def implicitly_wait(self, seconds):
+        self.implicit_wait = seconds
+
+    def get_cookies(self):
+        return list(self.cookies.values())
+
+    def add_cookie(self, cookie):
+        self.cookies[cookie["name"]] = dict(cookie)
+
+    # Finding things on the page.
+    def isPresent(self, name):
+        page = self.tab["page"]
+        course_key = courseKey(self.tab["url"])
+        if name == "login_failure":
+            return "failed_login" in self.tab["clicked"]
+        if name == "stepper":
+            return "export" in self.tab["clicked"]
+        if name == "download":
+            with exports_lock:
+                ready = exports.get(course_key)
+            return (
+                "export" in self.tab["clicked"]
+                and ready is not None
+                and (time.time() >= ready)
+            )
+        return any(p == page and n == name for p, n in elements.values())
+
+    def isVisible(self, name):
+        if name == "export_link":
+            return "tools" in self.tab["clicked"]
+        return self.isPresent(name)
+
+    def find_elements(self, by=By.ID, value=None):
+        located = elements.get((by, value))
+        deadline = time.time() + self.implicit_wait
+        while True:
+            if located is not None and self.isPresent(located[1]):
+                return [FakeElement(self, located[1])]
+            if time.time() >= deadline:
+                return []
+            time.sleep(0.1)
+
+    def find_element(self, by=By.ID, value=None):
+        found = self.find_elements(by, value)
+        if not found:
+            raise selenium_exceptions.NoSuchElementException(
+                "Fake page " + self.tab["page"] + " has no " + str(value)
+            )
+        return found[0]
+
+    # Doing things.
+    def clickElement(self, name):
+        time.sleep(settings["click"])
+        if not self.isVisible(name):
+            raise selenium_exceptions.ElementNotInteractableException(name)
+        tab = self.tab
+        if name == "sign_in":
+            if unlucky("login_failure"):
+                tab["clicked"].add("failed_login")
+                return
+            self.add_cookie({"name": "sessionid", "value": "fake-session"})
+            self.add_cookie({"name": "csrftoken", "value": "fake-csrf-token"})
+            self.get(urljoin(tab["url"], "/home"))
+        elif name == "export_link":
+            self.get(tab["url"].rstrip("/") + "/export")
+        elif name == "export":
+            course_key = courseKey(tab["url"])
+            ready = time.time() + settings["export_time"]
+            if unlucky("export_failure"):
+                ready = None
+            with exports_lock:
+                exports[course_key] = ready
+            tab["clicked"].add("export")
+        elif name == "download":
+            self.startDownload(courseKey(tab["url"]))
+        else:
+            tab["clicked"].add(name)
+
+    def downloadLink(self):
+        course_key = courseKey(self.tab["url"])
+        return (
+            "https://prod-edx-edxapp-import-export.s3.amazonaws.com/user_tasks/fake/"
+            + exportFilename(course_key)
+            + "?AWSAccessKeyId=FAKE"
+        )
+
+    def startDownload(self, course_key):
+        """Writes the export in the background, through a .part file like Firefox."""
+
+        def download():
+            path = os.path.join(self.download_folder, exportFilename(course_key))
+            data = courseTarball(course_key, settings["size"])
+            if unlucky("download_failure"):
+                data = data[: len(data) // 2]
+            with open(path + ".part", "wb") as f:
+                f.write(data)
+            time.sleep(settings["download_time"])
+            os.replace(path + ".part", path)
+
+        os.makedirs(self.download_folder, exist_ok=True)
+        if settings["download_time"] > 0:
+            threading.Thread(target=download, daemon=True).start()
+        else:
+            download()
+
+    def execute(self, command, params=None):
+        """Only handles ActionChains, which the login button needs."""
+        if command != Command.W3C_ACTIONS:
+            raise selenium_exceptions.WebDriverException(
+                "The fake browser can't do " + str(command)
+            )
+        target = None
+        for device in params["actions"]:
+            for action in device["actions"]:
+                origin = action.get("origin")
+                if isinstance(origin, dict):
+                    target = list(origin.values())[0]
+                if action["type"] == "pointerUp" and target is not None:
+                    self.clickElement(target)
+        return {"value": None}
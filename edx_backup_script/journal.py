@@ -0,0 +1,144 @@
+# An append-only record of where each course is in the backup run,
+# written as we go so a crashed run can pick up where it left off.
+#
+# Each line is one JSON record, like this:
+# {"time": "2024-05-08T14:02:11", "run": "20240508-140133", "url": "https://...",
+#  "state": "done", "archive": "/Users/me/Downloads/CS109xa_3T2023.tar.gz"}
+
+import os
+import json
+import datetime
+import threading
+
+default_journal = "edx_backup_journal.jsonl"
+
+# The states a course goes through.
+# "deferred" courses were left for another run, to finish by a deadline.
+course_states = ["queued", "exporting", "downloading", "done", "failed", "deferred"]
+
+
+def readJournal(path=default_journal):
+    """
+    Reads every record in a journal. A half-written last line is ignored.
+
+    Returns:
+    list: The records, oldest first.
+
+    """
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def lastRun(path=default_journal):
+    """
+    Returns:
+    str: The id of the most recent run in the journal, or None.
+
+    """
+    runs = [r["run"] for r in readJournal(path) if r.get("state") == "started"]
+    return runs[-1] if runs else None
+
+
+def courseStates(path=default_journal, run=None):
+    """
+    Works out the latest state of every course.
+
+    Parameters:
+    path (str): The journal file.
+    run (str): Only look at this run. Default is every run.
+
+    Returns:
+    dict: url -> the most recent record for that course.
+
+    """
+    states = {}
+    for record in readJournal(path):
+        if "url" not in record:
+            continue
+        if run is not None and record.get("run") != run:
+            continue
+        states[record["url"]] = record
+    return states
+
+
+def lastDone(path=default_journal):
+    """
+    Finds the last successful backup of every course, from any run.
+
+    Returns:
+    dict: url -> the most recent "done" record for that course.
+
+    """
+    done = {}
+    for record in readJournal(path):
+        if record.get("state") == "done" and "url" in record:
+            done[record["url"]] = record
+    return done
+
+
+def openJournal(path=default_journal, resume=False):
+    """
+    Opens the journal for appending and starts a run.
+
+    Parameters:
+    path (str): The journal file.
+    resume (bool): Carry on with the last run instead of starting a new one.
+
+    Returns:
+    dict: The open journal, to hand to record().
+
+    """
+    run = lastRun(path) if resume else None
+    if run is None:
+        run = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    journal = {
+        "path": path,
+        "run": run,
+        "file": open(path, "a"),
+        # Sessions and async downloads all write here.
+        "lock": threading.Lock(),
+    }
+    writeRecord(journal, {"state": "started", "resumed": resume})
+    return journal
+
+
+def writeRecord(journal, record):
+    record = dict(
+        {"time": datetime.datetime.now().isoformat(timespec="seconds")},
+        run=journal["run"],
+        **record
+    )
+    line = json.dumps(record) + "\n"
+    with journal["lock"]:
+        journal["file"].write(line)
+        journal["file"].flush()
+        os.fsync(journal["file"].fileno())
+
+
+def record(journal, url, state, **details):
+    """
+    Notes that a course has moved to a new state.
+
+    Parameters:
+    journal (dict): From openJournal().
+    url (str): The course outline URL.
+    state (str): One of course_states.
+    details: Anything else worth keeping, like archive=path or reason=text.
+
+    Returns:
+    void
+
+    """
+    writeRecord(journal, dict(url=url, state=state, **details))
+
+
+def closeJournal(journal):
+    journal["file"].close()
@@ -0,0 +1,188 @@
+# Makes the browser skip what the backup doesn't need: images, fonts,
+# video and audio, and analytics and tracking scripts. Page loads also
+# stop waiting for the "load" event ("eager"), since we wait for the
+# Tools menu ourselves anyway. Studio's own scripts, styles and API
+# calls all still load, so the Tools menu and export buttons work.
+#
+# Each course outline load is weighed with the browser's Performance API
+# (bytes transferred and seconds until the Tools menu showed up).
+# Normal runs with --weigh-pages keep a record of those in
+# ~/.edx_backup/page_weights.json, and lean runs report how much less
+# they took than that.
+
+import os
+import json
+import statistics
+import threading
+
+default_weights = os.path.join(
+    os.path.expanduser("~"), ".edx_backup", "page_weights.json"
+)
+# How many normal page loads to remember.
+max_samples = 50
+
+# Hosts that only serve analytics, tracking, ads or chat widgets.
+tracker_hosts = [
+    "www.google-analytics.com",
+    "ssl.google-analytics.com",
+    "region1.google-analytics.com",
+    "analytics.google.com",
+    "www.googletagmanager.com",
+    "stats.g.doubleclick.net",
+    "googleads.g.doubleclick.net",
+    "cdn.segment.com",
+    "api.segment.io",
+    "js-agent.newrelic.com",
+    "bam.nr-data.net",
+    "bam-cell.nr-data.net",
+    "static.hotjar.com",
+    "script.hotjar.com",
+    "cdn.optimizely.com",
+    "logx.optimizely.com",
+    "connect.facebook.net",
+    "snap.licdn.com",
+    "px.ads.linkedin.com",
+    "bat.bing.com",
+    "static.ads-twitter.com",
+    "analytics.twitter.com",
+    "cdn.cookielaw.org",
+    "geolocation.onetrust.com",
+    "static.zdassets.com",
+    "widget.intercom.io",
+]
+# Hosts that only serve web fonts.
+font_hosts = ["fonts.googleapis.com", "fonts.gstatic.com", "use.typekit.net"]
+
+# For Chrome, which blocks by URL pattern, one tab at a time.
+blocked_url_patterns = [
+    "*.woff",
+    "*.woff2",
+    "*.ttf",
+    "*.otf",
+    "*.eot",
+    "*.mp4",
+    "*.webm",
+    "*.mp3",
+    "*.m4a",
+    "*.ogg",
+]
+
+firefox_prefs = {
+    # No images.
+    "permissions.default.image": 2,
+    # No web fonts. Buttons are found by their text, not their icons.
+    "gfx.downloadable_fonts.enabled": False,
+    # No video or audio.
+    "media.autoplay.default": 5,
+    "media.preload.default": 0,
+    "media.preload.auto": 0,
+    # Tracker and font hosts resolve to this machine, where they fail at once.
+    "network.dns.localDomains": ",".join(tracker_hosts + font_hosts),
+}
+
+chrome_prefs = {"profile.managed_default_content_settings.images": 2}
+
+chrome_arguments = [
+    "--host-resolver-rules="
+    + ", ".join("MAP " + host + " ~NOTFOUND" for host in tracker_hosts + font_hosts),
+    "--autoplay-policy=user-gesture-required",
+]
+
+# Runs in the page. transferSize is 0 for anything that came from the
+# cache or from a site that doesn't share its timings, so this is
+# a lower bound on what was downloaded.
+page_weight_script = """
+var navigation = performance.getEntriesByType("navigation")[0] || {};
+var resources = performance.getEntriesByType("resource");
+var bytes = navigation.transferSize || 0;
+for (var i = 0; i < resources.length; i++) {
+    bytes += resources[i].transferSize || 0;
+}
+return {"bytes": bytes, "requests": resources.length + 1};
+"""
+
+
+def blockInTab(driver):
+    """
+    Blocks fonts and media in Chrome's current tab.
+    Chrome has no setting for these, so it's done over DevTools,
+    and has to be done again for each new tab.
+
+    Returns:
+    bool: True if it worked.
+
+    """
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked_url_patterns})
+    except Exception:
+        return False
+    return True
+
+
+def pageWeight(driver):
+    """
+    Returns:
+    dict: "bytes" and "requests" for the page the browser is showing,
+          or None if the browser can't tell us.
+
+    """
+    try:
+        weight = driver.execute_script(page_weight_script)
+    except Exception:
+        return None
+    if not isinstance(weight, dict) or "bytes" not in weight:
+        return None
+    return weight
+
+
+def openWeights(path=default_weights):
+    """
+    Returns:
+    dict: The record of normal page loads, for addSample() and savings().
+
+    """
+    samples = []
+    try:
+        with open(path, "r") as f:
+            samples = json.load(f).get("samples", [])
+    except (OSError, ValueError):
+        pass
+    return {"path": path, "samples": samples, "lock": threading.Lock()}
+
+
+def addSample(weights, bytes_loaded, seconds):
+    """Remembers one normal page load, and saves the record."""
+    if seconds is None:
+        return
+    with weights["lock"]:
+        weights["samples"].append({"bytes": bytes_loaded, "seconds": seconds})
+        del weights["samples"][:-max_samples]
+        folder = os.path.dirname(weights["path"])
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        temporary = weights["path"] + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump({"samples": weights["samples"]}, f)
+        os.replace(temporary, weights["path"])
+
+
+def savings(weights, bytes_loaded, seconds):
+    """
+    Compares a lean page load to the typical normal one.
+
+    Returns:
+    tuple: (bytes saved, seconds saved), or None with no normal loads on record.
+
+    """
+    if seconds is None:
+        return None
+    with weights["lock"]:
+        # Older records may be missing their time.
+        samples = [s for s in weights["samples"] if s.get("seconds") is not None]
+    if not samples:
+        return None
+    return (
+        statistics.median(s["bytes"] for s in samples) - bytes_loaded,
+        statistics.median(s["seconds"] for s in samples) - seconds,
+    )
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# Times each phase of each course's backup and writes the times to a CSV,
+# so we can tell whether a slow night was edX, the browser, or the network.
+#
+# Each row is one phase of one course:
+# run,time,course,phase,seconds
+# 20240508-140133,2024-05-08T14:03:02.518,course-v1:HarvardX+CS109xa+3T2023,download,41.2
+#
+# to see a summary:
+# python3 metrics.py edx_backup_metrics.csv
+
+import os
+import csv
+import sys
+import math
+import time
+import datetime
+import argparse
+import threading
+
+default_metrics = "edx_backup_metrics.csv"
+fieldnames = ["run", "time", "course", "phase", "seconds"]
+
+# The phases, in the order they happen. Not every engine has all of them.
+phases = [
+    "browser_start",
+    "login_page",
+    "login_submit",
+    "page_load",
+    "tools_menu",
+    "export_click",
+    "export_start",
+    "time_to_ready",
+    "download",
+]
+
+
+def openMetrics(path=default_metrics, run=None):
+    """
+    Opens the metrics file for appending.
+
+    Parameters:
+    path (str): The CSV file.
+    run (str): Which run these times belong to, like the journal's run id.
+
+    Returns:
+    dict: The open metrics file, to hand to startTimer() and lap().
+
+    """
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    f = open(path, "a", newline="")
+    writer = csv.DictWriter(f, fieldnames=fieldnames)
+    if new_file:
+        writer.writeheader()
+    return {
+        "file": f,
+        "writer": writer,
+        "run": run or datetime.datetime.now().strftime("%Y%m%d-%H%M%S"),
+        # course -> when its current phase started
+        "laps": {},
+        # Sessions and async downloads all time things at once.
+        "lock": threading.Lock(),
+    }
+
+
+def startTimer(metrics, course):
+    """Starts timing a course's first phase."""
+    with metrics["lock"]:
+        metrics["laps"][course] = time.time()
+
+
+def lap(metrics, course, phase):
+    """
+    Ends a course's current phase, writes down how long it took,
+    and starts timing the next one.
+
+    Returns:
+    float: The phase's length in seconds.
+
+    """
+    now = time.time()
+    with metrics["lock"]:
+        started = metrics["laps"].get(course, now)
+        metrics["laps"][course] = now
+        metrics["writer"].writerow(
+            {
+                "run": metrics["run"],
+                "time": datetime.datetime.fromtimestamp(now).isoformat(
+                    timespec="milliseconds"
+                ),
+                "course": course,
+                "phase": phase,
+                "seconds": round(now - started, 3),
+            }
+        )
+        metrics["file"].flush()
+    return now - started
+
+
+def closeMetrics(metrics):
+    metrics["file"].close()
+
+
+def readMetrics(path=default_metrics):
+    """
+    Returns:
+    list: Every row in the metrics file, with seconds as a float.
+
+    """
+    rows = []
+    if not os.path.exists(path):
+        return rows
+    with open(path, "r", newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                row["seconds"] = float(row["seconds"])
+            except (TypeError, ValueError):
+                continue
+            rows.append(row)
+    return rows
+
+
+def percentile(values, p):
+    """The nearest-rank percentile of a list of numbers."""
+    values = sorted(values)
+    rank = max(math.ceil(p / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def report(path=default_metrics, run=None, slowest=10):
+    """
+    Summarizes the metrics file.
+
+    Parameters:
+    path (str): The CSV file.
+    run (str): Only look at this run. Default is every run.
+    slowest (int): How many of the slowest courses to list.
+
+    Returns:
+    str: The report, ready to print.
+
+    """
+    rows = [r for r in readMetrics(path) if run is None or r["run"] == run]
+    if not rows:
+        return "No timings in " + path
+
+    lines = ["Phase            count      p50      p90      p99      max"]
+    by_phase = {}
+    for row in rows:
+        by_phase.setdefault(row["phase"], []).append(row["seconds"])
+    ordered = [p for p in phases if p in by_phase]
+    ordered += sorted(p for p in by_phase if p not in phases)
+    for phase in ordered:
+        values = by_phase[phase]
+        lines.append(
+            phase.ljust(14)
+            + str(len(values)).rjust(8)
+            + "".join(
+                ("%.1f" % percentile(values, p)).rjust(9) for p in [50, 90, 99, 100]
+            )
+        )
+
+    # Throughput: finished downloads over the wall-clock time of each run.
+    lines.append("")
+    total_courses = 0
+    total_seconds = 0
+    by_run = {}
+    for row in rows:
+        by_run.setdefault(row["run"], []).append(row)
+    for run_id, run_rows in sorted(by_run.items()):
+        ends = [datetime.datetime.fromisoformat(r["time"]) for r in run_rows]
+        starts = [
+            end - datetime.timedelta(seconds=r["seconds"])
+            for end, r in zip(ends, run_rows)
+        ]
+        span = (max(ends) - min(starts)).total_seconds()
+        courses = len(set(r["course"] for r in run_rows if r["phase"] == "download"))
+        total_courses += courses
+        total_seconds += span
+        per_hour = courses * 3600 / span if span > 0 else 0
+        lines.append(
+            "Run "
+            + run_id
+            + ": "
+            + str(courses)
+            + " courses in "
+            + str(datetime.timedelta(seconds=round(span)))
+            + ", "
+            + ("%.1f" % per_hour)
+            + " courses/hour"
+        )
+    if len(by_run) > 1 and total_seconds > 0:
+        lines.append(
+            "Overall: %.1f courses/hour" % (total_courses * 3600 / total_seconds)
+        )
+
+    # Slowest courses, by the total of all their phases.
+    totals = {}
+    for row in rows:
+        if row["course"]:
+            key = (row["run"], row["course"])
+            totals[key] = totals.get(key, 0) + row["seconds"]
+    lines.append("")
+    lines.append("Slowest courses:")
+    ranked = sorted(totals.items(), key=lambda t: -t[1])
+    for (run_id, course), seconds in ranked[:slowest]:
+        lines.append(
+            ("%.1f" % seconds).rjust(10) + "  " + course + "  (" + run_id + ")"
+        )
+
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("metrics", nargs="?", default=default_metrics)
+    parser.add_argument("--run", default=None, help="Only report on this run")
+    parser.add_argument("--slowest", type=int, default=10)
+    args = parser.parse_args()
+    if not os.path.exists(args.metrics):
+        sys.exit("Metrics file not found: " + args.metrics)
+    print(report(args.metrics, args.run, args.slowest))
+
+
+if __name__ == "__main__":
+    main()
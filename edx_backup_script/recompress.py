@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# Turns course exports from .tar.gz into seekable .tar.zst,
+# which is smaller and faster to unpack, and lets restore tools
+# pull out one file without decompressing the whole thing.
+#
+# The .tar.zst is a series of independent zstd frames, each holding
+# frame_size bytes of the tar file, followed by a seek table in a
+# skippable frame. This is zstd's "seekable format", so other tools
+# that know it can read these too:
+# https://github.com/facebook/zstd/blob/dev/contrib/seekable_format/zstd_seekable_compression_format.md
+#
+# Needs the zstandard package (pip install zstandard).
+
+import os
+import sys
+import gzip
+import bisect
+import struct
+import hashlib
+import argparse
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Works whether this is run as a script or from the installed package.
+try:
+    from edx_backup_script import backup_store
+    from edx_backup_script import verify
+except ImportError:
+    import backup_store
+    import verify
+
+instructions = """
+to run:
+python3 recompress.py compress MUS24.6x_2T2023.tar.gz (more files...)
+python3 recompress.py list MUS24.6x_2T2023.tar.zst
+python3 recompress.py get MUS24.6x_2T2023.tar.zst course/course.xml -o course.xml
+"""
+
+# Uncompressed bytes per frame. Smaller frames mean faster random access
+# and a slightly worse compression ratio.
+frame_size = 4 * 1024 * 1024
+zstd_level = 10
+
+skippable_magic = 0x184D2A5E
+seekable_magic = 0x8F92EAB1
+seek_footer = struct.Struct("<IBI")
+block_size = backup_store.block_size
+
+
+class RecompressError(Exception):
+    pass
+
+
+def needZstandard():
+    if zstandard is None:
+        raise RecompressError("Recompressing needs zstandard: pip install zstandard")
+
+
+def zstdName(archive):
+    """MUS24.6x_2T2023.tar.gz becomes MUS24.6x_2T2023.tar.zst"""
+    if archive.endswith(".tar.gz"):
+        return archive[: -len(".tar.gz")] + ".tar.zst"
+    return archive + ".zst"
+
+
+def seekTable(frames):
+    """Packs (compressed size, uncompressed size) pairs into a skippable frame."""
+    entries = b"".join(struct.pack("<II", c, d) for c, d in frames)
+    # No per-frame checksums in the table. Each frame carries its own.
+    footer = seek_footer.pack(len(frames), 0, seekable_magic)
+    table = entries + footer
+    return struct.pack("<II", skippable_magic, len(table)) + table
+
+
+def openSeekable(path):
+    """
+    Opens a seekable .tar.zst and reads its seek table.
+
+    Returns:
+    dict: A reader to pass to readAt(). Close reader["file"] when done.
+
+    """
+    needZstandard()
+    f = open(path, "rb")
+    try:
+        f.seek(-seek_footer.size, os.SEEK_END)
+        count, descriptor, magic = seek_footer.unpack(f.read(seek_footer.size))
+        if magic != seekable_magic:
+            raise RecompressError(path + " has no zstd seek table")
+        entry_size = 12 if descriptor & 0x80 else 8
+        f.seek(-(seek_footer.size + count * entry_size), os.SEEK_END)
+        table = f.read(count * entry_size)
+    except (OSError, struct.error):
+        f.close()
+        raise RecompressError(path + " is not a seekable zstd file")
+
+    # (compressed offset, compressed size, uncompressed offset, uncompressed size)
+    frames = []
+    compressed_offset = 0
+    uncompressed_offset = 0
+    for i in range(count):
+        c, d = struct.unpack_from("<II", table, i * entry_size)
+        frames.append((compressed_offset, c, uncompressed_offset, d))
+        compressed_offset += c
+        uncompressed_offset += d
+    return {
+        "file": f,
+        "frames": frames,
+        "starts": [frame[2] for frame in frames],
+        "size": uncompressed_offset,
+        "decompressor": zstandard.ZstdDecompressor(),
+        # The last frame we unpacked, since reads tend to land near each other.
+        "cached": (None, b""),
+    }
+
+
+def readFrame(reader, index):
+    if reader["cached"][0] != index:
+        compressed_offset, c, _, d = reader["frames"][index]
+        reader["file"].seek(compressed_offset)
+        data = reader["decompressor"].decompress(
+            reader["file"].read(c), max_output_size=d
+        )
+        reader["cached"] = (index, data)
+    return reader["cached"][1]
+
+
+def readAt(reader, offset, length):
+    """
+    Reads part of the tar file, unpacking only the frames it touches.
+
+    Returns:
+    bytes: Up to length bytes starting at offset.
+
+    """
+    pieces = []
+    end = min(offset + length, reader["size"])
+    index = max(bisect.bisect_right(reader["starts"], offset) - 1, 0)
+    while index < len(reader["frames"]) and reader["starts"][index] < end:
+        start = reader["starts"][index]
+        data = readFrame(reader, index)
+        pieces.append(data[max(offset - start, 0) : end - start])
+        index += 1
+    return b"".join(pieces)
+
+
+def readRange(path, offset, length):
+    """Reads length bytes of the tar file inside a .tar.zst, starting at offset."""
+    reader = openSeekable(path)
+    try:
+        return readAt(reader, offset, length)
+    finally:
+        reader["file"].close()
+
+
+def tarMembers(reader):
+    """
+    Walks the tar headers, skipping over file contents without unpacking them.
+
+    Yields:
+    tuple: (name, offset of its data, size) for each file.
+
+    """
+    offset = 0
+    long_name = None
+    while offset + block_size <= reader["size"]:
+        header = readAt(reader, offset, block_size)
+        if header == b"\0" * block_size:
+            return
+        size = backup_store.tarEntrySize(header)
+        entry_type = header[156:157]
+        if entry_type in [b"L", b"x"]:
+            record = readAt(reader, offset + block_size, size)
+            long_name = verify.readRecordName(entry_type, record)
+        elif entry_type in backup_store.file_types:
+            name = long_name
+            if name is None:
+                name = header[:100].rstrip(b"\0").decode("utf-8", "replace")
+                if header[257:262] == b"ustar" and header[345:500].strip(b"\0"):
+                    prefix = header[345:500].rstrip(b"\0").decode("utf-8", "replace")
+                    name = prefix + "/" + name
+            long_name = None
+            yield name, offset + block_size, size
+        else:
+            long_name = None
+        offset += block_size + size + (-size % block_size)
+
+
+def extractMember(path, name):
+    """
+    Gets one file out of a .tar.zst.
+
+    Returns:
+    bytes: The file's contents.
+
+    """
+    reader = openSeekable(path)
+    try:
+        for member, offset, size in tarMembers(reader):
+            if member.lstrip("./") == name.lstrip("./"):
+                return readAt(reader, offset, size)
+    finally:
+        reader["file"].close()
+    raise KeyError(name + " is not in " + path)
+
+
+def recompressArchive(archive, remove_original=True):
+    """
+    Rewrites a .tar.gz as a seekable .tar.zst next to it.
+    The new file is read back and checked against the original's
+    contents before the original is removed.
+
+    Parameters:
+    archive (str): The .tar.gz course export.
+    remove_original (bool): Delete the .tar.gz once the .tar.zst checks out.
+
+    Returns:
+    dict: "path", "size", "original_size", and "sha256" of the tar inside.
+
+    """
+    needZstandard()
+    destination = zstdName(archive)
+    partial = destination + ".part"
+    compressor = zstandard.ZstdCompressor(level=zstd_level, write_checksum=True)
+
+    tar_hash = hashlib.sha256()
+    frames = []
+    with gzip.open(archive, "rb") as source, open(partial, "wb") as out:
+        while True:
+            data = backup_store.readExactly(source, frame_size)
+            if not data:
+                break
+            tar_hash.update(data)
+            frame = compressor.compress(data)
+            out.write(frame)
+            frames.append((len(frame), len(data)))
+        out.write(seekTable(frames))
+
+    # Read every frame back through the seek table, the way restores will.
+    reader = openSeekable(partial)
+    check_hash = hashlib.sha256()
+    try:
+        for index in range(len(reader["frames"])):
+            check_hash.update(readFrame(reader, index))
+    except zstandard.ZstdError as e:
+        os.remove(partial)
+        raise RecompressError("Couldn't read back " + partial + ": " + str(e))
+    finally:
+        reader["file"].close()
+    if check_hash.hexdigest() != tar_hash.hexdigest():
+        os.remove(partial)
+        raise RecompressError(destination + " doesn't match " + archive)
+
+    os.replace(partial, destination)
+    original_size = os.path.getsize(archive)
+    if remove_original:
+        os.remove(archive)
+    return {
+        "path": destination,
+        "size": os.path.getsize(destination),
+        "original_size": original_size,
+        "sha256": tar_hash.hexdigest(),
+    }
+
+
+def lowerPriority():
+    """Runs in each worker process, so recompressing yields to downloads."""
+    if hasattr(os, "nice"):
+        os.nice(10)
+
+
+def main():
+    parser = argparse.ArgumentParser(usage=instructions)
+    parser.add_argument("command", choices=["compress", "list", "get"])
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("-o", "--output", help='Where to write the file from "get"')
+    parser.add_argument(
+        "-k", "--keep", action="store_true", help="Keep the original .tar.gz"
+    )
+    args = parser.parse_args()
+
+    try:
+        if args.command == "compress":
+            for archive in args.files:
+                result = recompressArchive(archive, not args.keep)
+                print(
+                    archive
+                    + ": "
+                    + str(result["original_size"])
+                    + " -> "
+                    + str(result["size"])
+                    + " bytes in "
+                    + result["path"]
+                )
+        elif args.command == "list":
+            reader = openSeekable(args.files[0])
+            for name, offset, size in tarMembers(reader):
+                print(str(size).rjust(12) + "  " + name)
+            reader["file"].close()
+        else:
+            if len(args.files) != 2:
+                sys.exit(instructions)
+            data = extractMember(args.files[0], args.files[1])
+            if args.output:
+                with open(args.output, "wb") as f:
+                    f.write(data)
+            else:
+                sys.stdout.buffer.write(data)
+    except RecompressError as e:
+        sys.exit(str(e))
+
+
+if __name__ == "__main__":
+    main()
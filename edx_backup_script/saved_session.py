@@ -0,0 +1,122 @@
+# Keeps a signed-in edX session between runs, so a run can skip the
+# login page, and so a run from cron doesn't need anyone to type a password.
+#
+# The session is the browser's cookies for each edX site, including
+# Studio's csrftoken. They're encrypted with Fernet (from the
+# cryptography package) in ~/.edx_backup/session.enc.
+#
+# The key comes from the EDX_BACKUP_SESSION_KEY environment variable if
+# it's set. Otherwise it's made the first time and kept in
+# ~/.edx_backup/session.key, readable only by you. Anyone who can read
+# both files can use your edX login until it expires, so for anything
+# but your own machine, keep the key in the environment variable instead.
+
+import os
+import json
+import time
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:
+    Fernet = None
+
+default_session = os.path.join(os.path.expanduser("~"), ".edx_backup", "session.enc")
+default_key = os.path.join(os.path.expanduser("~"), ".edx_backup", "session.key")
+key_variable = "EDX_BACKUP_SESSION_KEY"
+# Bump this if what we save changes.
+session_version = 1
+
+
+class SessionError(Exception):
+    pass
+
+
+def writePrivate(path, data):
+    """Writes bytes to a file only this user can read, replacing it all at once."""
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    temporary = path + ".tmp"
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    descriptor = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(descriptor, "wb") as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+
+def sessionKey(key_path=default_key, create=False):
+    """
+    Parameters:
+    key_path (str): The key file, if the environment variable isn't set.
+    create (bool): Make a new key file if there isn't one.
+
+    Returns:
+    Fernet: Ready to encrypt and decrypt.
+
+    """
+    if Fernet is None:
+        raise SessionError("Saved sessions need cryptography: pip install cryptography")
+    key = os.environ.get(key_variable)
+    if key is None:
+        if not os.path.exists(key_path):
+            if not create:
+                raise SessionError("No session key at " + key_path)
+            writePrivate(key_path, Fernet.generate_key())
+        with open(key_path, "rb") as f:
+            key = f.read().strip()
+    try:
+        return Fernet(key)
+    except (ValueError, TypeError):
+        raise SessionError("The session key isn't a Fernet key.")
+
+
+def saveSession(cookies, path=default_session, key_path=default_key):
+    """
+    Encrypts a signed-in session and saves it.
+
+    Parameters:
+    cookies (dict): site -> list of cookie dicts, from collectSessionCookies().
+    path (str): Where to save it.
+    key_path (str): The key file, made if needed.
+
+    """
+    payload = {"version": session_version, "saved": time.time(), "cookies": cookies}
+    token = sessionKey(key_path, create=True).encrypt(
+        json.dumps(payload).encode("utf-8")
+    )
+    writePrivate(path, token)
+
+
+def loadSession(sites, path=default_session, key_path=default_key):
+    """
+    Decrypts a saved session. It may still have expired on edX's end,
+    so sign in with it and check that Studio loads.
+
+    Parameters:
+    sites (list): The sites we need cookies for.
+    path (str): Where it was saved.
+    key_path (str): The key file.
+
+    Returns:
+    dict: site -> list of cookie dicts, for transplantSession().
+
+    """
+    if not os.path.exists(path):
+        raise SessionError("No saved session at " + path)
+    key = sessionKey(key_path)
+    with open(path, "rb") as f:
+        token = f.read()
+    try:
+        payload = json.loads(key.decrypt(token).decode("utf-8"))
+    except InvalidToken:
+        raise SessionError("The saved session doesn't match this key.")
+    except ValueError:
+        raise SessionError("The saved session is damaged.")
+    if payload.get("version") != session_version:
+        raise SessionError("The saved session is from another version.")
+    cookies = payload.get("cookies", {})
+    missing = [site for site in sites if site not in cookies]
+    if missing:
+        raise SessionError("The saved session has no cookies for " + missing[0])
+    return cookies
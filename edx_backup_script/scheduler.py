@@ -0,0 +1,346 @@
+# Guesses how long each course will take to back up, from how long it
+# took before, and uses that to pick an order for the run and to fit
+# the run into a time window.
+#
+# Where the guesses come from, best first:
+# 1. The course's own times in the metrics file (the median of its runs).
+# 2. The size of its last export in the journal, scaled by how fast
+#    courses of known size have gone.
+# 3. How many blocks its outline has, if we could get the outline.
+# 4. The median of every course we've seen, or default_estimate if none.
+#
+# The same history sets how long to wait for each course's export and
+# download, and how often to check on it. See waitPlan().
+
+import re
+import datetime
+import statistics
+
+# Works whether this is run as a script or from the installed package.
+try:
+    from edx_backup_script import journal
+    from edx_backup_script import metrics
+    from edx_backup_script import studio_api
+except ImportError:
+    import journal
+    import metrics
+    import studio_api
+
+# Seconds to guess when there's no history at all.
+default_estimate = 300
+# For outline-based guesses, until the journal has enough to fit them.
+default_block_seconds = 0.5
+default_base_seconds = 60
+
+orders = ["file", "shortest", "largest"]
+
+# Phases that belong to a run, not to a course.
+run_phases = ["browser_start", "login_page", "login_submit"]
+
+# Timeouts are this percentile of a course's past times, with room to spare.
+timeout_percentile = 95
+timeout_margin = 1.5
+min_export_timeout = 120  # seconds
+min_download_timeout = 30  # seconds
+# Courses with no history of their own borrow everyone's, if there's enough.
+min_samples = 5
+# Checks on an export start this far apart and spread out by poll_backoff.
+min_poll = 1  # seconds
+max_poll = 60  # seconds
+poll_backoff = 1.5
+
+
+def courseHistory(metrics_path, journal_path):
+    """
+    Gathers what past runs tell us about each course.
+
+    Returns:
+    dict: course key -> {"seconds": [totals per run],
+                         "phases": {phase: [seconds, ...]},
+                         "size": bytes, "blocks": n}
+          Size and blocks are from the course's latest journal records.
+
+    """
+    history = {}
+    totals = {}
+    for row in metrics.readMetrics(metrics_path):
+        if not row["course"] or row["phase"] in run_phases:
+            continue
+        key = (row["run"], row["course"])
+        totals[key] = totals.get(key, 0) + row["seconds"]
+        entry = history.setdefault(row["course"], {"seconds": [], "phases": {}})
+        entry["phases"].setdefault(row["phase"], []).append(row["seconds"])
+    for (run, course), seconds in totals.items():
+        history[course]["seconds"].append(seconds)
+
+    for record in journal.readJournal(journal_path):
+        if "url" not in record:
+            continue
+        entry = history.setdefault(
+            studio_api.courseKey(record["url"]), {"seconds": [], "phases": {}}
+        )
+        if record.get("state") == "done" and record.get("size"):
+            entry["size"] = record["size"]
+        if record.get("blocks") is not None:
+            entry["blocks"] = record["blocks"]
+    return history
+
+
+def fitLine(points):
+    """
+    A least-squares line through (x, seconds) points, kept non-negative.
+
+    Returns:
+    tuple: (base seconds, seconds per unit of x), or None with too few points.
+
+    """
+    if len(points) < 2:
+        return None
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    mean_x = statistics.mean(xs)
+    mean_y = statistics.mean(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    if spread == 0:
+        return None
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+    slope = max(slope, 0)
+    return (max(mean_y - slope * mean_x, 0), slope)
+
+
+def outlineBlocks(outline):
+    """Counts the sections, subsections and units in a course outline."""
+    count = 0
+    for child in outline.get("child_info", {}).get("children", []):
+        count += 1 + outlineBlocks(child)
+    return count
+
+
+def makeModel(history):
+    """
+    Fits the fallbacks to everything in the history.
+
+    Returns:
+    dict: The history and the fitted lines, for estimate().
+
+    """
+    known = {
+        c: statistics.median(h["seconds"]) for c, h in history.items() if h["seconds"]
+    }
+    by_size = [
+        (history[c]["size"], s) for c, s in known.items() if "size" in history[c]
+    ]
+    by_blocks = [
+        (history[c]["blocks"], s) for c, s in known.items() if "blocks" in history[c]
+    ]
+    phases = {}
+    for entry in history.values():
+        for phase, seconds in entry["phases"].items():
+            phases.setdefault(phase, []).extend(seconds)
+    return {
+        "history": history,
+        "known": known,
+        "size_line": fitLine(by_size),
+        "block_line": fitLine(by_blocks)
+        or (default_base_seconds, default_block_seconds),
+        "typical": statistics.median(known.values()) if known else default_estimate,
+        # phase -> every course's times, for courses with no history of their own
+        "phases": phases,
+    }
+
+
+def estimate(model, course_key, blocks=None):
+    """
+    Guesses how many seconds one course will take.
+
+    Parameters:
+    model (dict): From makeModel().
+    course_key (str): Like course-v1:HarvardX+CS109xa+3T2023
+    blocks (int): How many blocks its outline has, if we know.
+
+    Returns:
+    tuple: (seconds, where the guess came from)
+
+    """
+    if course_key in model["known"]:
+        return model["known"][course_key], "history"
+    entry = model["history"].get(course_key, {})
+    if model["size_line"] is not None and "size" in entry:
+        base, per_byte = model["size_line"]
+        return base + per_byte * entry["size"], "size"
+    if blocks is None:
+        blocks = entry.get("blocks")
+    if blocks is not None:
+        base, per_block = model["block_line"]
+        return base + per_block * blocks, "outline"
+    return model["typical"], "typical"
+
+
+def orderCourses(urls, estimates, order):
+    """
+    Parameters:
+    urls (list): Course URLs, in file order.
+    estimates (dict): url -> estimated seconds.
+    order (str): "file", "shortest" (first), or "largest" (first).
+
+    Returns:
+    list: The URLs in the new order. Ties keep their file order.
+
+    """
+    if order == "shortest":
+        return sorted(urls, key=lambda u: estimates[u])
+    if order == "largest":
+        return sorted(urls, key=lambda u: -estimates[u])
+    return list(urls)
+
+
+def fitDeadline(urls, estimates, seconds, lanes=1):
+    """
+    Picks as many courses as will finish in time. With several lanes
+    (sessions, pipeline tabs, or async exports), each course goes to
+    whichever lane frees up first. Shortest-first fits the most courses.
+
+    Parameters:
+    urls (list): Course URLs.
+    estimates (dict): url -> estimated seconds.
+    seconds (float): Time until the deadline.
+    lanes (int): How many courses run at once.
+
+    Returns:
+    tuple: (the courses that fit, the courses deferred)
+
+    """
+    free_at = [0.0] * max(lanes, 1)
+    fits = []
+    deferred = []
+    for url in sorted(urls, key=lambda u: estimates[u]):
+        lane = free_at.index(min(free_at))
+        if free_at[lane] + estimates[url] <= seconds:
+            free_at[lane] += estimates[url]
+            fits.append(url)
+        else:
+            deferred.append(url)
+    # Put them back in file order, for orderCourses() to sort.
+    position = {url: n for n, url in enumerate(urls)}
+    fits.sort(key=position.get)
+    deferred.sort(key=position.get)
+    return fits, deferred
+
+
+def parseDeadline(text, now=None):
+    """
+    Reads a deadline like "06:30" (the next time it's 6:30),
+    "2024-05-09T06:30", or a length of time like "7h", "90m" or "2h30m".
+
+    Returns:
+    datetime.datetime: When the run has to be done.
+
+    """
+    now = now or datetime.datetime.now()
+    text = text.strip()
+    length = re.fullmatch(r"(?:(\d+(?:\.\d+)?)h)?(?:(\d+(?:\.\d+)?)m)?", text)
+    if length and text:
+        hours, minutes = length.groups()
+        return now + datetime.timedelta(
+            hours=float(hours or 0), minutes=float(minutes or 0)
+        )
+    clock = re.fullmatch(r"(\d{1,2}):(\d{2})", text)
+    if clock:
+        deadline = now.replace(
+            hour=int(clock.group(1)),
+            minute=int(clock.group(2)),
+            second=0,
+            microsecond=0,
+        )
+        if deadline <= now:
+            deadline += datetime.timedelta(days=1)
+        return deadline
+    try:
+        return datetime.datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError("Can't read the deadline " + text)
+
+
+def phaseSamples(model, course_key, phase):
+    """
+    Returns:
+    tuple: (the course's past times for a phase, or everyone's if it has none
+            and there are enough; and "course", "all courses", or "default")
+
+    """
+    own = model["history"].get(course_key, {}).get("phases", {}).get(phase, [])
+    if own:
+        return own, "course"
+    everyone = model["phases"].get(phase, [])
+    if len(everyone) >= min_samples:
+        return everyone, "all courses"
+    return [], "default"
+
+
+def waitPlan(model, course_key, defaults, overrides=None):
+    """
+    Works out how long to wait for a course's export and download.
+
+    Parameters:
+    model (dict): From makeModel().
+    course_key (str): Like course-v1:HarvardX+CS109xa+3T2023
+    defaults (dict): "export_timeout", "download_timeout" and "poll_interval"
+                     to use without history. A poll_interval of None adapts.
+    overrides (dict): The same keys, from the command line. None means unset.
+
+    Returns:
+    dict: The defaults' keys, plus "expected" (when the export should be
+          ready, or None) and "source" (what it's all based on).
+
+    """
+    plan = dict(defaults, expected=None)
+    ready, plan["source"] = phaseSamples(model, course_key, "time_to_ready")
+    if ready:
+        plan["expected"] = statistics.median(ready)
+        timeout = metrics.percentile(ready, timeout_percentile) * timeout_margin
+        if plan["source"] == "course":
+            plan["export_timeout"] = max(timeout, min_export_timeout)
+        else:
+            # Only a course's own history can make it give up sooner than usual.
+            plan["export_timeout"] = max(timeout, defaults["export_timeout"])
+    downloads, source = phaseSamples(model, course_key, "download")
+    if downloads:
+        timeout = metrics.percentile(downloads, timeout_percentile) * timeout_margin
+        if source == "course":
+            plan["download_timeout"] = max(timeout, min_download_timeout)
+        else:
+            plan["download_timeout"] = max(timeout, defaults["download_timeout"])
+    for name, value in (overrides or {}).items():
+        if value is not None:
+            plan[name] = value
+    return plan
+
+
+def nextPoll(plan, waited, last_delay, floor=min_poll):
+    """
+    How long to wait before checking on an export again. Checks start
+    close together and spread out, without sleeping past the time the
+    export is expected. Once it's overdue, checks come every tenth of
+    the expected time.
+
+    Parameters:
+    plan (dict): From waitPlan().
+    waited (float): Seconds since the export started.
+    last_delay (float): The last wait, or 0 for the first.
+    floor (float): The shortest wait allowed.
+
+    Returns:
+    float: Seconds to wait.
+
+    """
+    if plan["poll_interval"] is not None:
+        # --poll-interval can't go under the floor either.
+        return max(plan["poll_interval"], floor)
+    delay = last_delay * poll_backoff if last_delay else floor
+    expected = plan["expected"]
+    if expected is not None:
+        if waited < expected:
+            delay = min(delay, expected - waited)
+        else:
+            delay = min(delay, expected / 10)
+    return min(max(delay, floor), max(max_poll, floor))
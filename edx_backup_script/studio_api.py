@@ -0,0 +1,200 @@
+# Starts, checks on, and downloads course exports through
+# Studio's import/export endpoints, without a browser.
+
+import json
+import time
+import urllib3
+from urllib.parse import urljoin, urlparse
+
+# Works whether this is run as a script or from the installed package.
+try:
+    from edx_backup_script import downloads
+except ImportError:
+    import downloads
+
+studio_url = "https://studio.edx.org"
+
+# Studio's ExportStatus values. Negative numbers are failures.
+export_succeeded = 3
+
+# How long Studio gets to answer one request, and how many more tries
+# it gets when it doesn't.
+request_timeout = urllib3.Timeout(connect=30, read=60)
+max_request_retries = 3
+
+
+class StudioError(Exception):
+    pass
+
+
+def courseKey(url):
+    """
+    Gets the course key from a course outline URL.
+    https://course-authoring.edx.org/course/course-v1:HarvardX+CS109xa+3T2023
+    becomes course-v1:HarvardX+CS109xa+3T2023
+    """
+    return url.rstrip("/").split("/course/")[-1].split("/")[0]
+
+
+def makeSession(cookies=None, token=None, base_url=None):
+    """
+    Gathers what we need to make authenticated requests to Studio.
+
+    Parameters:
+    cookies (list): Cookie dicts from a signed-in webdriver's get_cookies().
+    token (str): A JWT access token, if you have one instead of cookies.
+    base_url (str): Where Studio lives. Defaults to studio.edx.org.
+
+    Returns:
+    dict: A session to pass to the other functions here.
+
+    """
+    base_url = (base_url or studio_url).rstrip("/")
+    headers = {
+        "Accept": "application/json",
+        # Django's CSRF check wants a Referer from the same site.
+        "Referer": base_url + "/home",
+    }
+    if cookies:
+        headers["Cookie"] = "; ".join(c["name"] + "=" + c["value"] for c in cookies)
+        for c in cookies:
+            if c["name"] == "csrftoken":
+                headers["X-CSRFToken"] = c["value"]
+    if token:
+        headers["Authorization"] = "JWT " + token
+
+    return {"base_url": base_url, "headers": headers, "pool": downloads.http}
+
+
+def studioRequest(session, method, path):
+    """
+    Makes a request to Studio and decodes the JSON reply.
+    Timeouts and dropped connections are tried again a few times.
+
+    Returns:
+    dict: The response body.
+
+    """
+    url = session["base_url"] + path
+    retries = 0
+    while True:
+        try:
+            response = session["pool"].request(
+                method,
+                url,
+                headers=session["headers"],
+                redirect=False,
+                retries=False,
+                timeout=request_timeout,
+            )
+            break
+        except downloads.network_errors as e:
+            retries += 1
+            if retries > max_request_retries:
+                raise StudioError("No answer from " + url + ": " + repr(e))
+            time.sleep(2**retries)
+    if response.status in (301, 302, 401, 403):
+        raise StudioError(
+            "Not signed in to Studio (HTTP " + str(response.status) + ") at " + url
+        )
+    if response.status != 200:
+        raise StudioError("HTTP " + str(response.status) + " from " + url)
+    try:
+        return json.loads(response.data.decode("utf-8"))
+    except ValueError:
+        raise StudioError("Studio didn't send JSON from " + url)
+
+
+def courseOutline(session, course_key):
+    """
+    Gets the course outline, the same JSON the outline page is built from.
+    Besides the sections and subsections, it has the course's
+    edited_on and published_on times.
+
+    Returns:
+    dict: The course's outline.
+
+    """
+    return studioRequest(session, "GET", "/course/" + course_key)
+
+
+def changeSignal(session, course_key):
+    """
+    Something that changes whenever the course content does.
+    Studio updates the course's edited_on time when anything in it is edited,
+    and published_on when anything is published.
+
+    Returns:
+    str: The signal, or None if Studio didn't give us either time.
+
+    """
+    outline = courseOutline(session, course_key)
+    edited = outline.get("edited_on")
+    published = outline.get("published_on")
+    if edited is None and published is None:
+        return None
+    return str(edited) + " | " + str(published)
+
+
+def startExport(session, course_key):
+    """Asks Studio to start building an export of the course."""
+    return studioRequest(session, "POST", "/export/" + course_key)
+
+
+def exportStatus(session, course_key):
+    """
+    Checks on a course's export.
+
+    Returns:
+    dict: Studio's status, like {"ExportStatus": 3, "ExportOutput": "https://..."}
+
+    """
+    status = studioRequest(session, "GET", "/export_status/" + course_key)
+    if status.get("ExportStatus", 0) < 0:
+        raise StudioError(
+            "Export failed for " + course_key + ": " + str(status.get("ExportError"))
+        )
+    return status
+
+
+def exportOutputURL(session, status):
+    """
+    Gets the download link from a finished export's status.
+
+    Returns:
+    str: The link, or None if the export isn't done yet.
+
+    """
+    if status.get("ExportStatus") != export_succeeded:
+        return None
+    output = status.get("ExportOutput")
+    if not output:
+        return None
+    # With local file storage Studio gives us a path instead of an S3 link.
+    return urljoin(session["base_url"] + "/", output)
+
+
+def downloadExport(
+    session, output_url, destination, on_chunk=None, on_size=None, throttle=None
+):
+    """
+    Streams a finished export to disk.
+    on_chunk, on_size and throttle are passed along to downloads.streamDownload().
+
+    Returns:
+    int: The size of the file in bytes.
+
+    """
+    # Only send our credentials back to Studio itself, not to S3.
+    headers = {}
+    if urlparse(output_url).netloc == urlparse(session["base_url"]).netloc:
+        headers = session["headers"]
+    return downloads.streamDownload(
+        output_url,
+        destination,
+        headers=headers,
+        pool=session["pool"],
+        on_chunk=on_chunk,
+        on_size=on_size,
+        throttle=throttle,
+    )
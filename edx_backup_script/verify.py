@@ -0,0 +1,234 @@
+# Checks that a course export is a whole, readable .tar.gz,
+# in one pass over its bytes. The bytes can come straight from the
+# download as they arrive, or from the finished file.
+#
+# A good export has:
+#   gzip data that decompresses, with a matching CRC and length at the end
+#   tar headers with good checksums, ending in the two zero blocks
+#   a course/course.xml file
+
+import zlib
+import hashlib
+
+# Works whether this is run as a script or from the installed package.
+try:
+    from edx_backup_script import backup_store
+except ImportError:
+    import backup_store
+
+block_size = backup_store.block_size
+chunk_size = backup_store.chunk_size
+# Don't let one small chunk of a very compressible file balloon in memory.
+max_decompressed = 4 * 1024 * 1024
+# Long names and pax records are small. Anything bigger isn't an edX export.
+max_name_record = 1024 * 1024
+
+
+def newCheck():
+    """
+    Starts checking an archive. Feed it bytes with feed() or feedAt(),
+    then call finish().
+
+    Returns:
+    dict: The check in progress.
+
+    """
+    return {
+        "sha256": hashlib.sha256(),
+        "size": 0,
+        # 16 + MAX_WBITS means gzip, and zlib checks the CRC and length for us.
+        "gzip": zlib.decompressobj(16 + zlib.MAX_WBITS),
+        "error": None,
+        # Set if we missed some bytes, so the file has to be read again.
+        "lost": False,
+        # Where we are in the tar stream.
+        "header": b"",
+        "skip": 0,
+        "record": None,
+        "record_type": None,
+        "long_name": None,
+        "zero_blocks": 0,
+        "members": 0,
+        "course_xml": False,
+    }
+
+
+def fail(check, reason):
+    if check["error"] is None:
+        check["error"] = reason
+
+
+def readRecordName(record_type, data):
+    """Gets the file name out of a GNU long name or pax header."""
+    if record_type == b"L":
+        return data.rstrip(b"\0").decode("utf-8", "replace")
+    # Pax records look like "27 path=course/course.xml\n"
+    for line in data.split(b"\n"):
+        key_value = line.partition(b" ")[2]
+        key, _, value = key_value.partition(b"=")
+        if key == b"path":
+            return value.decode("utf-8", "replace")
+    return None
+
+
+def checkHeader(check, header):
+    """Handles one 512-byte tar header."""
+    if header == b"\0" * block_size:
+        check["zero_blocks"] += 1
+        return
+    if check["zero_blocks"] >= 2:
+        # Past the end of the archive. Tar pads with zeros, but we don't care.
+        return
+    if check["zero_blocks"] > 0:
+        fail(check, "tar has an empty block before member " + str(check["members"]))
+        return
+
+    stored = header[148:156].replace(b"\0", b" ").strip()
+    computed = sum(header[:148]) + 8 * ord(" ") + sum(header[156:])
+    try:
+        stored = int(stored, 8)
+    except ValueError:
+        stored = None
+    if stored != computed:
+        fail(check, "bad tar header after " + str(check["members"]) + " members")
+        return
+
+    size = backup_store.tarEntrySize(header)
+    check["skip"] = size + (-size % block_size)
+    entry_type = header[156:157]
+    if entry_type in [b"L", b"x"]:
+        if size > max_name_record:
+            fail(check, "tar has a " + str(size) + " byte name record")
+            return
+        check["record"] = bytearray()
+        check["record_type"] = entry_type
+        return
+
+    name = check["long_name"]
+    check["long_name"] = None
+    if name is None:
+        name = header[:100].rstrip(b"\0").decode("utf-8", "replace")
+        if header[257:262] == b"ustar" and header[345:500].strip(b"\0"):
+            prefix = header[345:500].rstrip(b"\0").decode("utf-8", "replace")
+            name = prefix + "/" + name
+    check["members"] += 1
+    if name.lstrip("./") == "course/course.xml":
+        check["course_xml"] = True
+
+
+def feedTar(check, data):
+    """Walks the tar headers in some freshly decompressed bytes."""
+    position = 0
+    while position < len(data) and check["error"] is None:
+        if check["skip"] > 0:
+            piece = data[position : position + check["skip"]]
+            position += len(piece)
+            check["skip"] -= len(piece)
+            if check["record"] is not None:
+                check["record"] += piece
+                if check["skip"] == 0:
+                    check["long_name"] = readRecordName(
+                        check["record_type"], bytes(check["record"])
+                    )
+                    check["record"] = None
+            continue
+
+        needed = block_size - len(check["header"])
+        check["header"] += data[position : position + needed]
+        position += needed
+        if len(check["header"]) == block_size:
+            header = check["header"]
+            check["header"] = b""
+            checkHeader(check, header)
+
+
+def feedGzip(check, data):
+    """Decompresses some bytes of the archive and walks what comes out."""
+    while data and check["error"] is None:
+        decompressor = check["gzip"]
+        if decompressor.eof:
+            # Another gzip member right after this one is allowed.
+            if not data.startswith(b"\x1f\x8b"):
+                if data.strip(b"\0"):
+                    fail(check, "extra data after the end of the gzip stream")
+                return
+            check["gzip"] = decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            while True:
+                output = decompressor.decompress(data, max_decompressed)
+                feedTar(check, memoryview(output))
+                data = decompressor.unconsumed_tail
+                if not data and len(output) < max_decompressed:
+                    break
+        except zlib.error as e:
+            fail(check, "gzip data is corrupt: " + str(e))
+            return
+        data = decompressor.unused_data
+
+
+def feed(check, chunk):
+    """Adds the next bytes of the archive to the check."""
+    check["sha256"].update(chunk)
+    check["size"] += len(chunk)
+    feedGzip(check, chunk)
+
+
+def feedAt(check, offset, chunk):
+    """
+    Same as feed(), for downloads that can restart or resume.
+    A chunk at offset 0 starts the check over.
+    A chunk anywhere else we didn't expect means we lost track,
+    and finishing the check will need the whole file.
+
+    """
+    if offset == 0 and check["size"] > 0:
+        check.clear()
+        check.update(newCheck())
+    if offset != check["size"]:
+        check["lost"] = True
+    if not check["lost"]:
+        feed(check, chunk)
+
+
+def finish(check):
+    """
+    Finishes checking, once every byte has been fed in.
+
+    Returns:
+    dict: "ok" (bool), "reason" (why not, or None), "sha256", "size", "members"
+
+    """
+    if not check["gzip"].eof:
+        fail(check, "gzip stream ends early")
+    if check["skip"] > 0 or check["header"]:
+        fail(check, "tar ends in the middle of a member")
+    if check["zero_blocks"] < 2:
+        fail(check, "tar is missing its end-of-archive blocks")
+    if not check["course_xml"]:
+        fail(check, "no course/course.xml")
+    return {
+        "ok": check["error"] is None,
+        "reason": check["error"],
+        "sha256": check["sha256"].hexdigest(),
+        "size": check["size"],
+        "members": check["members"],
+    }
+
+
+def checkFile(path, check=None):
+    """
+    Checks an archive on disk. If a check that was fed from the download
+    is passed in, and it didn't lose track, the file isn't read again.
+
+    Returns:
+    dict: Same as finish().
+
+    """
+    if check is None or check["lost"]:
+        check = newCheck()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                feed(check, chunk)
+                if check["error"] is not None:
+                    break
+    return finish(check)
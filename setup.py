@@ -47,6 +47,12 @@ requirements = [
     "wsproto",
 ]
 
+# Optional extras, like pip install edx_backup_script[index]
+extras = {
+    # Gzip checkpoints for utils/tar_index.py.
+    "index": ["indexed_gzip"],
+}
+
 test_requirements = [
     # TODO: put package test requirements here
 ]
@@ -63,6 +69,11 @@ setup(
     entry_points={
         "console_scripts": [
             "{}={}.PullEdXBackups:PullEdXBackups".format(project_name, project_name),
+            "edx_backup_store={}.backup_store:main".format(project_name),
+            "edx_backup_zstd={}.recompress:main".format(project_name),
+            "edx_backup_report={}.metrics:main".format(project_name),
+            "edx_backup_daemon={}.backup_daemon:main".format(project_name),
+            "edx_backup_client={}.backup_client:main".format(project_name),
         ]
     },
     data_files=[
@@ -71,6 +82,9 @@ setup(
     ],
     include_package_data=True,
     install_requires=requirements,
+    extras_require=extras,
+    # asyncio.to_thread and os.waitstatus_to_exitcode
+    python_requires=">=3.9",
     zip_safe=False,
     keywords="hx edx backup tarball " + project_name,
     classifiers=[
@@ -78,8 +92,9 @@ setup(
         "Intended Audience :: Developers",
         "Natural Language :: English",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.6",
-        "Programming Language :: Python :: 3.8",
+        "Programming Language :: Python :: 3.9",
+        "Programming Language :: Python :: 3.10",
+        "Programming Language :: Python :: 3.11",
     ],
     test_suite="tests",
     tests_require=test_requirements,
@@ -0,0 +1,185 @@
+# Runs the real backup script against the fake Studio with lots of
+# made-up courses, and reports how fast it went and what it cost.
+#
+# to run:
+# python3 benchmark.py
+# python3 benchmark.py --courses 10 100 --engine rest --delay 2 --size 1000000
+# python3 benchmark.py --engine fake --delay 1 -- -p 50
+#
+# The fake engine is the browser engine with --fake-browser, which pretends
+# to be both the browser and edX, so it doesn't need the fake Studio at all.
+#
+# Each run gets its own temporary home folder, so the downloads,
+# journal, log and metrics don't touch your real ones.
+# Needs a Unix-like system, for os.wait4.
+
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import fake_studio
+
+script = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "edx_backup_script",
+    "PullEdXBackups.py",
+)
+
+
+def writeCourseList(path, base_url, count):
+    """Writes a course CSV like the real ones, pointing at the fake Studio."""
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["Course", "URL"])
+        writer.writeheader()
+        for i in range(count):
+            writer.writerow(
+                {
+                    "Course": "Benchmark " + str(i),
+                    "URL": base_url + "/course/course-v1:BenchX+B" + str(i) + "+1T2024",
+                }
+            )
+
+
+def peakMemoryMB(rusage):
+    # Linux reports ru_maxrss in kilobytes, macOS in bytes.
+    if platform.system() == "Darwin":
+        return rusage.ru_maxrss / (1024 * 1024)
+    return rusage.ru_maxrss / 1024
+
+
+def countDone(journal_path):
+    done = set()
+    if not os.path.exists(journal_path):
+        return 0
+    with open(journal_path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("state") == "done":
+                done.add(record["url"])
+    return len(done)
+
+
+def runOnce(base_url, count, engine, extra_args, keep=False, delay=5, size=0):
+    """
+    Backs up count fake courses with the real script, in a child process.
+
+    Returns:
+    dict: What happened, for the report.
+
+    """
+    # A clean home folder, without even a Downloads folder,
+    # so the script has to make everything it needs.
+    folder = tempfile.mkdtemp(prefix="edx_benchmark_")
+    course_list = os.path.join(folder, "courses.csv")
+    writeCourseList(course_list, base_url, count)
+
+    if engine == "fake":
+        # Only edX's export time is slow. The pretend browser is instant.
+        settings = "export_time=" + str(delay) + ",size=" + str(size)
+        settings += ",page_load=0,click=0,download_time=0"
+        command = [sys.executable, script, "--fake-browser", settings]
+    else:
+        command = [sys.executable, script, "-e", engine, "--studio-url", base_url]
+    if engine in ["rest", "async"]:
+        command += ["--token", "benchmark"]
+    command += extra_args + [course_list]
+    env = dict(os.environ, HOME=folder)
+
+    start = time.time()
+    with open(os.path.join(folder, "output.txt"), "w") as output:
+        child = subprocess.Popen(
+            command, cwd=folder, env=env, stdout=output, stderr=subprocess.STDOUT
+        )
+        # wait4 gives us this child's own CPU time and peak memory.
+        _, status, rusage = os.wait4(child.pid, 0)
+        child.returncode = os.waitstatus_to_exitcode(status)
+    elapsed = time.time() - start
+
+    result = {
+        "courses": count,
+        "done": countDone(os.path.join(folder, "edx_backup_journal.jsonl")),
+        "seconds": elapsed,
+        "cpu": rusage.ru_utime + rusage.ru_stime,
+        "peak_mb": peakMemoryMB(rusage),
+        "exit": child.returncode,
+        "folder": folder,
+    }
+    if not keep:
+        shutil.rmtree(folder)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--engine", default="async", help="browser, rest, async, or fake")
+    parser.add_argument(
+        "--delay", type=float, default=5, help="Seconds for the fake Studio to export"
+    )
+    parser.add_argument(
+        "--size", type=int, default=0, help="Bytes of filler per export"
+    )
+    parser.add_argument(
+        "--keep", action="store_true", help="Keep each run's folder to look at"
+    )
+    parser.add_argument(
+        "script_args", nargs="*", help="Passed to the backup script, after --"
+    )
+    args = parser.parse_args()
+
+    server = fake_studio.startServer(0, args.delay, args.size)
+    base_url = "http://127.0.0.1:" + str(server.server_address[1])
+    print(
+        "Fake Studio at "
+        + base_url
+        + ", "
+        + str(args.delay)
+        + "s exports, "
+        + str(args.size)
+        + " byte filler, "
+        + args.engine
+        + " engine"
+    )
+    print("courses   done   seconds   courses/hour   CPU seconds   CPU %   peak MB")
+
+    for count in args.courses:
+        result = runOnce(
+            base_url,
+            count,
+            args.engine,
+            args.script_args,
+            args.keep,
+            args.delay,
+            args.size,
+        )
+        per_hour = result["done"] * 3600 / result["seconds"]
+        print(
+            str(result["courses"]).rjust(7)
+            + str(result["done"]).rjust(7)
+            + ("%.1f" % result["seconds"]).rjust(10)
+            + ("%.0f" % per_hour).rjust(15)
+            + ("%.1f" % result["cpu"]).rjust(14)
+            + ("%.0f" % (100 * result["cpu"] / result["seconds"])).rjust(8)
+            + ("%.0f" % result["peak_mb"]).rjust(10)
+        )
+        if result["exit"] != 0:
+            print("  Script exited with " + str(result["exit"]) + ".")
+        if args.keep:
+            print("  Kept " + result["folder"])
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+# A stand-in for edX's login page, Studio, and its export endpoints,
+# for trying out the backup script without touching the real edX.
+# The HTML pages use the same ids and text the browser engine looks for.
+#
+# to run:
+# python3 fake_studio.py --port 8000 --delay 5
+#
+# then point the backup script at it:
+# edx_backup_script -e rest --token anything --studio-url http://localhost:8000 test.csv
+# edx_backup_script --studio-url http://localhost:8000 test.csv
+#
+# with course URLs in test.csv like
+# http://localhost:8000/course/course-v1:HarvardX+CS109xa+3T2023
+
+import io
+import os
+import re
+import time
+import json
+import tarfile
+import hashlib
+import argparse
+import threading
+from urllib.parse import unquote, quote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def makeCourseTarball(course_key, size=0):
+    """
+    Builds a small but real-looking course export in memory.
+
+    Parameters:
+    course_key (str): Like course-v1:HarvardX+CS109xa+3T2023
+    size (int): Roughly how many bytes of static assets to include.
+
+    Returns:
+    bytes: A .tar.gz file.
+
+    """
+    org, course, run = course_key.split(":")[-1].split("+")
+    files = {
+        "course/course.xml": '<course url_name="%s" org="%s" course="%s"/>\n'
+        % (run, org, course),
+        "course/course/%s.xml" % run: '<course display_name="%s"/>\n' % course,
+        "course/policies/%s/policy.json" % run: json.dumps({"course/" + run: {}}),
+    }
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for name, text in files.items():
+            data = text.encode("utf-8")
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+        if size > 0:
+            info = tarfile.TarInfo("course/static/filler.bin")
+            info.size = size
+            tar.addfile(info, io.BytesIO(os.urandom(size)))
+    return buffer.getvalue()
+
+
+class FakeStudio(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, export_delay=5, export_size=0):
+        super().__init__(address, FakeStudioHandler)
+        self.export_delay = export_delay
+        self.export_size = export_size
+        # course key -> time the export was started
+        self.exports = {}
+        self.tarballs = {}
+        # Course keys whose exports fail, like Studio's ExportStatus -1.
+        self.failing = set()
+        # Bytes to send before dropping each course's first download,
+        # to try out resuming. None to send it all.
+        self.cut_after = None
+        # Courses whose download has been dropped already.
+        self.cut = set()
+        # Courses whose download was picked up again with a Range request.
+        self.resumed = set()
+        self.edited_on = time.strftime("%b %d, %Y at %H:%M UTC", time.gmtime())
+        self.lock = threading.Lock()
+
+
+def exportFilename(course_key):
+    """Studio names exports like course.zibb8idm.tar.gz"""
+    return (
+        "course." + hashlib.sha1(course_key.encode("utf-8")).hexdigest()[:8] + ".tar.gz"
+    )
+
+
+login_page = """<html><head><title>Sign in</title></head><body>
+<form method="post" action="/login">
+<input id="emailOrUsername" name="username">
+<input id="password" name="password" type="password">
+<button id="sign-in" type="submit">Sign in</button>
+</form>
+</body></html>"""
+
+home_page = """<html><head><title>Studio Home</title></head><body>
+<input id="pgn-searchfield-input-1" type="search">
+</body></html>"""
+
+outline_page = """<html><head><title>Course Outline</title></head><body>
+<button id="Tools-dropdown-menu"
+  onclick="document.getElementById('tools').style.display = 'block'">Tools</button>
+<div id="tools" style="display: none">
+<a href="/course/%(key)s/export">Export Course</a>
+</div>
+</body></html>"""
+
+export_page = """<html><head><title>Course Export</title></head><body>
+<button onclick="startExport()">Export course content</button>
+<div class="course-stepper" style="display: none">Preparing your export</div>
+<div id="download"></div>
+<script>
+function startExport() {
+  fetch("/export/%(key)s", {method: "POST"}).then(function () {
+    document.querySelector(".course-stepper").style.display = "block";
+    checkStatus();
+  });
+}
+function checkStatus() {
+  fetch("/export_status/%(key)s").then(function (r) { return r.json(); })
+    .then(function (status) {
+      if (status.ExportStatus != 3) { return setTimeout(checkStatus, 1000); }
+      var link = document.createElement("a");
+      link.href = status.ExportOutput;
+      link.textContent = "Download exported course";
+      document.getElementById("download").appendChild(link);
+    });
+}
+</script>
+</body></html>"""
+
+
+class FakeStudioHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def sendJSON(self, body, status=200):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def sendHTML(self, page, status=200):
+        data = page.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def redirect(self, location, cookies=None):
+        self.send_response(302)
+        self.send_header("Location", location)
+        for cookie in cookies or []:
+            self.send_header("Set-Cookie", cookie + "; Path=/")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def signedIn(self):
+        if self.headers.get("Cookie") or self.headers.get("Authorization"):
+            return True
+        self.redirect("/login")
+        return False
+
+    def wantsJSON(self):
+        return "application/json" in self.headers.get("Accept", "")
+
+    def do_POST(self):
+        if self.path == "/login":
+            # Any username and password will do.
+            length = int(self.headers.get("Content-Length", 0))
+            self.rfile.read(length)
+            return self.redirect(
+                "/home", ["sessionid=fake-session", "csrftoken=fake-csrf-token"]
+            )
+        match = re.match(r"^/export/(.+)$", self.path)
+        if not match:
+            return self.sendJSON({}, 404)
+        if not self.signedIn():
+            return
+        course_key = unquote(match.group(1))
+        with self.server.lock:
+            self.server.exports[course_key] = time.time()
+        self.sendJSON({"ExportStatus": 1})
+
+    def do_GET(self):
+        outline_match = re.match(r"^/course/([^/]+)$", self.path)
+        export_match = re.match(r"^/course/([^/]+)/export$", self.path)
+        status_match = re.match(r"^/export_status/(.+)$", self.path)
+        output_match = re.match(r"^/export_output/([^/]+)", self.path)
+        if self.path == "/login":
+            self.sendHTML(login_page)
+        elif self.path == "/robots.txt":
+            self.sendHTML("User-agent: *\n")
+        elif self.path == "/home":
+            if not self.signedIn():
+                return
+            self.sendHTML(home_page)
+        elif outline_match:
+            if not self.signedIn():
+                return
+            course_key = unquote(outline_match.group(1))
+            if self.wantsJSON():
+                self.courseOutline(course_key)
+            else:
+                self.sendHTML(outline_page % {"key": quote(course_key)})
+        elif export_match:
+            if not self.signedIn():
+                return
+            self.sendHTML(export_page % {"key": quote(unquote(export_match.group(1)))})
+        elif status_match:
+            if not self.signedIn():
+                return
+            self.exportStatus(unquote(status_match.group(1)))
+        elif output_match:
+            if not self.signedIn():
+                return
+            self.exportOutput(unquote(output_match.group(1)))
+        else:
+            self.sendJSON({}, 404)
+
+    def courseOutline(self, course_key):
+        # Every course looks like it was last edited when the server started.
+        self.sendJSON(
+            {
+                "id": "block-v1:" + course_key.split(":")[-1] + "+type@course",
+                "edited_on": self.server.edited_on,
+                "published_on": self.server.edited_on,
+                "child_info": {"children": []},
+            }
+        )
+
+    def exportStatus(self, course_key):
+        started = self.server.exports.get(course_key)
+        if started is None:
+            return self.sendJSON({"ExportStatus": 0})
+        if time.time() - started < self.server.export_delay:
+            return self.sendJSON({"ExportStatus": 2})
+        if course_key in self.server.failing:
+            return self.sendJSON(
+                {"ExportStatus": -1, "ExportError": "Fake export failure"}
+            )
+        self.sendJSON(
+            {
+                "ExportStatus": 3,
+                "ExportOutput": "/export_output/"
+                + quote(course_key)
+                + "/"
+                + exportFilename(course_key),
+            }
+        )
+
+    def exportOutput(self, course_key):
+        with self.server.lock:
+            if course_key not in self.server.tarballs:
+                self.server.tarballs[course_key] = makeCourseTarball(
+                    course_key, self.server.export_size
+                )
+            data = self.server.tarballs[course_key]
+
+        # Support resuming, like S3 does.
+        start = 0
+        byte_range = re.match(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if byte_range:
+            start = int(byte_range.group(1))
+            with self.server.lock:
+                self.server.resumed.add(course_key)
+            self.send_response(206)
+            self.send_header(
+                "Content-Range",
+                "bytes %d-%d/%d" % (start, len(data) - 1, len(data)),
+            )
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "application/x-tgz")
+        self.send_header(
+            "Content-Disposition",
+            'attachment; filename="' + exportFilename(course_key) + '"',
+        )
+        self.send_header("Content-Length", str(len(data) - start))
+        self.end_headers()
+        with self.server.lock:
+            cut = (
+                self.server.cut_after is not None and course_key not in self.server.cut
+            )
+            if cut:
+                self.server.cut.add(course_key)
+        if cut:
+            # Hang up partway, like a dropped connection.
+            self.wfile.write(data[start : start + self.server.cut_after])
+            self.close_connection = True
+            return
+        self.wfile.write(data[start:])
+
+
+def startServer(port=0, export_delay=5, export_size=0):
+    """
+    Runs a fake Studio in a background thread.
+
+    Returns:
+    FakeStudio: The server. Its address is server.server_address.
+
+    """
+    server = FakeStudio(("127.0.0.1", port), export_delay, export_size)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--delay", type=float, default=5, help="Seconds to build an export"
+    )
+    parser.add_argument(
+        "--size", type=int, default=0, help="Bytes of filler in each export"
+    )
+    args = parser.parse_args()
+
+    server = FakeStudio(("127.0.0.1", args.port), args.delay, args.size)
+    print("Fake Studio running at http://127.0.0.1:" + str(args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
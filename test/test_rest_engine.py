@@ -0,0 +1,86 @@
+# Runs the rest engine against the fake Studio.
+#
+# to run, from the repository folder:
+# python3 -m pytest test
+
+import os
+import sys
+import importlib
+
+import pytest
+
+import fake_studio
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+@pytest.fixture(scope="module")
+def backups(tmp_path_factory):
+    """The backup script, logging to a throwaway folder instead of the repository."""
+    folder = tmp_path_factory.mktemp("log")
+    here = os.getcwd()
+    os.chdir(folder)
+    try:
+        module = importlib.import_module("edx_backup_script.PullEdXBackups")
+    finally:
+        os.chdir(here)
+    return module
+
+
+@pytest.fixture
+def studio():
+    server = fake_studio.startServer(0, export_delay=0, export_size=100000)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    """A home folder with no Downloads folder in it yet."""
+    monkeypatch.setenv("HOME", str(tmp_path))
+    return tmp_path
+
+
+def session(backups, server):
+    base_url = "http://127.0.0.1:" + str(server.server_address[1])
+    return backups.studio_api.makeSession(token="test", base_url=base_url)
+
+
+def courseURL(server, course):
+    return (
+        "http://127.0.0.1:"
+        + str(server.server_address[1])
+        + "/course/course-v1:TestX+"
+        + course
+        + "+1T2024"
+    )
+
+
+def testDownloadsIntoNewFolder(backups, studio, home, monkeypatch):
+    monkeypatch.setattr(backups, "rest_poll_interval", 0.1)
+    url = courseURL(studio, "T1")
+    assert backups.getCourseExportREST(session(backups, studio), url, "new")
+
+    archive = home / "Downloads" / "new" / backups.courseArchiveName(url)
+    assert archive.read_bytes() == studio.tarballs["course-v1:TestX+T1+1T2024"]
+
+
+def testResumesDroppedDownload(backups, studio, home, monkeypatch):
+    monkeypatch.setattr(backups, "rest_poll_interval", 0.1)
+    studio.cut_after = 5000
+    url = courseURL(studio, "T2")
+    course_key = "course-v1:TestX+T2+1T2024"
+    assert backups.getCourseExportREST(session(backups, studio), url, None)
+
+    assert course_key in studio.resumed
+    archive = home / "Downloads" / backups.courseArchiveName(url)
+    assert archive.read_bytes() == studio.tarballs[course_key]
+    assert not os.path.exists(str(archive) + ".part")
+
+
+def testFailedExport(backups, studio, home, monkeypatch):
+    monkeypatch.setattr(backups, "rest_poll_interval", 0.1)
+    studio.failing.add("course-v1:TestX+T3+1T2024")
+    url = courseURL(studio, "T3")
+    assert not backups.getCourseExportREST(session(backups, studio), url, None)
+    assert not (home / "Downloads" / backups.courseArchiveName(url)).exists()
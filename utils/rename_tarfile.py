@@ -3,10 +3,13 @@
 # according to the course name and run number.
 
 import os
+import time
 import tarfile
 import argparse
+import concurrent.futures
 import xml.etree.ElementTree as ET
 # import lxml.etree as ET
+import tar_index
 
 def rename_tarfile(filename):
     # Read the tarfile without extracting it
@@ -30,17 +33,100 @@ def rename_tarfile(filename):
     print('Renamed to: ' + new_name)
 
 
+def read_course_id(filename):
+    # Reads the archive as a stream and stops at course/course.xml,
+    # so we only decompress as far as we need to.
+    with tarfile.open(filename, 'r|*') as tar:
+        for member in tar:
+            if member.name.lstrip('./') == 'course/course.xml':
+                root = ET.parse(tar.extractfile(member)).getroot()
+                return root.attrib['course'], root.attrib['url_name']
+    raise ValueError('No course/course.xml in ' + filename)
+
+
+def read_course_id_and_index(filename):
+    # Same as read_course_id, but reads the whole archive
+    # so it can build the random-access index in the same pass.
+    index = tar_index.build_index(filename)
+    if index['course'] is None:
+        raise ValueError('No course/course.xml in ' + filename)
+    return index['course'], index['run']
+
+
+def pick_new_name(filename, course_name, run_number):
+    # Renamed files stay in their own folder.
+    # If the name is taken by some other file, add _2, _3, and so on.
+    folder = os.path.dirname(filename)
+    base = course_name + '_' + run_number
+    new_name = os.path.join(folder, base + '.tar.gz')
+    count = 1
+    while os.path.exists(new_name) and not os.path.samefile(new_name, filename):
+        count += 1
+        new_name = os.path.join(folder, base + '_' + str(count) + '.tar.gz')
+    return new_name
+
+
+def bulk_rename(filenames, workers=None, build_index=False):
+    # Reading course.xml is the slow part, so that happens in a process pool.
+    # The renames themselves happen here, one at a time, so two files
+    # can't grab the same new name.
+    start = time.time()
+    total_bytes = 0
+    renamed = 0
+    skipped = 0
+    failed = 0
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        reader = read_course_id_and_index if build_index else read_course_id
+        futures = {pool.submit(reader, f): f for f in filenames}
+        for future in concurrent.futures.as_completed(futures):
+            filename = futures[future]
+            total_bytes += os.path.getsize(filename)
+            try:
+                course_name, run_number = future.result()
+            except Exception as e:
+                print('Could not read ' + filename + ': ' + repr(e))
+                failed += 1
+                continue
+
+            new_name = pick_new_name(filename, course_name, run_number)
+            if os.path.exists(new_name):
+                # Already has the right name, probably from an earlier run.
+                skipped += 1
+                continue
+            os.rename(filename, new_name)
+            if build_index:
+                tar_index.move_index(filename, new_name)
+            print(filename + ' -> ' + new_name)
+            renamed += 1
+
+    elapsed = max(time.time() - start, 0.001)
+    print(
+        'Renamed ' + str(renamed) + ', already named ' + str(skipped)
+        + ', failed ' + str(failed) + ' in ' + str(round(elapsed, 1)) + ' seconds.'
+    )
+    print(
+        str(round(len(filenames) / elapsed, 1)) + ' files/second, '
+        + str(round(total_bytes / elapsed / 1024 / 1024, 1)) + ' MB/second.'
+    )
+
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('filenames', help='A glob pattern for the tarfiles to rename', nargs='+')
+    parser.add_argument('-b', '--bulk', help='Rename many files in parallel', action='store_true')
+    parser.add_argument('-w', '--workers', help='Processes to use with --bulk', type=int, default=None)
+    parser.add_argument('-i', '--index', help='Also build tar_index sidecars, with --bulk', action='store_true')
     args = parser.parse_args()
 
-    # filenames = glob.glob(args.tarfiles)
-    for filename in args.filenames:
-        rename_tarfile(filename)
+    if args.bulk:
+        bulk_rename(args.filenames, args.workers, args.index)
+    else:
+        # filenames = glob.glob(args.tarfiles)
+        for filename in args.filenames:
+            rename_tarfile(filename)
 
     print('Done!')
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# Builds a sidecar index for edX .tar.gz exports so single files
+# can be pulled out without decompressing the whole archive.
+#
+# The index is two files next to the archive:
+#   course.tar.gz.idx.json - every member's name, offset, size and SHA-256
+#   course.tar.gz.gzidx    - gzip checkpoints (zran-style), so we can start
+#                            decompressing near a member instead of at the top
+#
+# The checkpoints need the indexed_gzip package
+# (pip install edx_backup_script[index], or pip install indexed_gzip).
+# Without it you still get the member table, and lookups fall back to
+# decompressing from the start of the archive up to the member.
+#
+# to run:
+# python3 tar_index.py build *.tar.gz
+# python3 tar_index.py list MUS24.6x_2T2023.tar.gz
+# python3 tar_index.py get MUS24.6x_2T2023.tar.gz course/policies/course/policy.json
+
+import os
+import sys
+import gzip
+import json
+import hashlib
+import tarfile
+import argparse
+import xml.etree.ElementTree as ET
+
+try:
+    import indexed_gzip
+except ImportError:
+    indexed_gzip = None
+
+# How far apart the gzip checkpoints are, in uncompressed bytes.
+# Each one costs 32KB in the .gzidx file.
+checkpoint_spacing = 4 * 1024 * 1024
+
+
+def index_paths(filename):
+    return filename + '.idx.json', filename + '.gzidx'
+
+
+def open_archive(filename, checkpoints=None):
+    # An indexed_gzip file builds checkpoints as it's read,
+    # or uses the ones we saved earlier.
+    if indexed_gzip is None:
+        return gzip.open(filename, 'rb')
+    if checkpoints is not None and os.path.exists(checkpoints):
+        return indexed_gzip.IndexedGzipFile(filename, index_file=checkpoints)
+    return indexed_gzip.IndexedGzipFile(filename, spacing=checkpoint_spacing)
+
+
+def build_index(filename):
+    # One pass over the archive: hash every member, note where it starts,
+    # and drop gzip checkpoints along the way.
+    # Returns the index, which also has the course name and run from course.xml.
+    index_file, checkpoint_file = index_paths(filename)
+    members = []
+    course_name = None
+    run_number = None
+
+    archive = open_archive(filename)
+    with tarfile.open(fileobj=archive, mode='r|') as tar:
+        for member in tar:
+            entry = {
+                'name': member.name,
+                'offset': member.offset_data,
+                'size': member.size,
+                'type': 'file' if member.isfile() else 'other',
+            }
+            if member.isfile():
+                # In stream mode each member can only be read once.
+                is_course_xml = member.name.lstrip('./') == 'course/course.xml'
+                data = tar.extractfile(member)
+                digest = hashlib.sha256()
+                kept = []
+                for piece in iter(lambda: data.read(1024 * 1024), b''):
+                    digest.update(piece)
+                    if is_course_xml:
+                        kept.append(piece)
+                entry['sha256'] = digest.hexdigest()
+
+                # While we're here, pick up the course's name for renaming.
+                if is_course_xml:
+                    root = ET.fromstring(b''.join(kept))
+                    course_name = root.attrib.get('course')
+                    run_number = root.attrib.get('url_name')
+            members.append(entry)
+
+    checkpoints = None
+    if indexed_gzip is not None:
+        archive.export_index(checkpoint_file)
+        checkpoints = os.path.basename(checkpoint_file)
+    archive.close()
+
+    index = {
+        'archive_size': os.path.getsize(filename),
+        'checkpoints': checkpoints,
+        'course': course_name,
+        'run': run_number,
+        'members': members,
+    }
+    with open(index_file, 'w') as f:
+        json.dump(index, f)
+    return index
+
+
+def move_index(filename, new_name):
+    # Brings the sidecar files along when an archive is renamed.
+    old_index, old_checkpoints = index_paths(filename)
+    new_index, new_checkpoints = index_paths(new_name)
+    with open(old_index, 'r') as f:
+        index = json.load(f)
+    if index['checkpoints'] is not None:
+        os.rename(old_checkpoints, new_checkpoints)
+        index['checkpoints'] = os.path.basename(new_checkpoints)
+    with open(new_index, 'w') as f:
+        json.dump(index, f)
+    os.remove(old_index)
+
+
+def load_index(filename):
+    index_file, checkpoint_file = index_paths(filename)
+    with open(index_file, 'r') as f:
+        index = json.load(f)
+    if index['archive_size'] != os.path.getsize(filename):
+        raise ValueError('Index is out of date for ' + filename)
+    return index
+
+
+def extract_member(filename, name):
+    # Looks up one member in the index and reads just that member.
+    # Returns its bytes, after checking them against the hash in the index.
+    index = load_index(filename)
+    matches = [m for m in index['members'] if m['name'] == name and m['type'] == 'file']
+    if not matches:
+        raise KeyError(name + ' is not in ' + filename)
+    member = matches[-1]
+
+    checkpoint_file = None
+    if index['checkpoints'] is not None:
+        checkpoint_file = os.path.join(os.path.dirname(filename), index['checkpoints'])
+    archive = open_archive(filename, checkpoint_file)
+    try:
+        archive.seek(member['offset'])
+        data = archive.read(member['size'])
+    finally:
+        archive.close()
+
+    if hashlib.sha256(data).hexdigest() != member['sha256']:
+        raise ValueError(name + ' does not match its hash in the index')
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['build', 'list', 'get'])
+    parser.add_argument('filename', help='The .tar.gz archive(s)', nargs='+')
+    parser.add_argument('-o', '--output', help='Where to write the file from "get"')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        for filename in args.filename:
+            index = build_index(filename)
+            print('Indexed ' + filename + ': ' + str(len(index['members'])) + ' members')
+        if indexed_gzip is None:
+            print('indexed_gzip is not installed, so no gzip checkpoints were saved.')
+    elif args.command == 'list':
+        for member in load_index(args.filename[0])['members']:
+            print(str(member['size']).rjust(12) + '  ' + member['name'])
+    else:
+        if len(args.filename) != 2:
+            sys.exit('Usage: tar_index.py get archive.tar.gz member/name')
+        data = extract_member(args.filename[0], args.filename[1])
+        if args.output:
+            with open(args.output, 'wb') as f:
+                f.write(data)
+        else:
+            sys.stdout.buffer.write(data)
+
+
+if __name__ == "__main__":
+    main()